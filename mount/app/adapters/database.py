@@ -1,11 +1,461 @@
+import asyncio
+import functools
+import random
+import re
 import ssl
+import statistics
+import sys
+import time
+from collections import deque
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Generator
+from contextvars import ContextVar
+from contextvars import Token
+from types import FrameType
 from types import TracebackType
 from typing import Any
+from typing import Literal
 from typing import Type
+from typing import TypeVar
 
+import asyncpg
+from app.common import logger
 from databases import Database
 from databases.core import Connection
 from databases.core import Transaction
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from prometheus_client import Histogram
+
+T = TypeVar("T")
+
+READS = Counter(
+    "database_replica_reads_total",
+    "Reads sent to a database replica, including hedged duplicates",
+)
+HEDGED_READS = Counter(
+    "database_hedged_reads_total",
+    "Reads which were slow enough to be repeated on a second replica",
+)
+HEDGED_READ_WINS = Counter(
+    "database_hedged_read_wins_total",
+    "Hedged reads where the second replica answered first",
+)
+
+POOL_CHECKOUT_SECONDS = Histogram(
+    "database_pool_checkout_seconds",
+    "Time spent waiting to check a connection out of a database pool",
+    ["pool"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+)
+POOL_CHECKOUT_TIMEOUTS = Counter(
+    "database_pool_checkout_timeouts_total",
+    "Checkouts which gave up waiting for a database connection",
+    ["pool"],
+)
+POOL_CONNECTIONS_IN_USE = Gauge(
+    "database_pool_connections_in_use",
+    "Database connections currently checked out of the pool",
+    ["pool"],
+)
+POOL_CONNECTIONS_IDLE = Gauge(
+    "database_pool_connections_idle",
+    "Open database connections waiting in the pool",
+    ["pool"],
+)
+POOL_CONNECTIONS_OPENED = Counter(
+    "database_pool_connections_opened_total",
+    "Database connections opened by the pool",
+    ["pool"],
+)
+POOL_CONNECTIONS_CLOSED = Counter(
+    "database_pool_connections_closed_total",
+    "Database connections closed by the pool",
+    ["pool"],
+)
+
+QUERY_SECONDS = Histogram(
+    "database_query_seconds",
+    "Time taken by database queries, by the repository function issuing them",
+    ["caller"],
+)
+
+# hedging of a query starts once this many of its latencies have been
+# observed, and its hedge delay is recomputed each time this many more
+# have been observed
+_MIN_HEDGE_SAMPLES = 100
+_HEDGE_SAMPLE_WINDOW = 1000
+
+# percentiles of a fingerprint's latency are taken over this many of its
+# most recent runs, and at most this many fingerprints are tracked
+_QUERY_STATS_WINDOW = 1000
+_MAX_QUERY_FINGERPRINTS = 1000
+
+
+# matches `:name` placeholders, but not `::type` casts
+_NAMED_PARAM = re.compile(r"(?<!:):([A-Za-z_][A-Za-z0-9_]*)")
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_query(query: str) -> tuple[str, tuple[str, ...]]:
+    """\
+    Convert a query with `:name` placeholders into asyncpg's positional
+    `$n` form, along with the parameter names in positional order.
+    """
+    names: list[str] = []
+
+    def replace(match: re.Match[str]) -> str:
+        name = match.group(1)
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+
+    return _NAMED_PARAM.sub(replace, query), tuple(names)
+
+
+def _positional_args(names: tuple[str, ...], values: dict | None) -> list[Any]:
+    if values is None:
+        return []
+
+    return [values[name] for name in names]
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMERIC_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_POSITIONAL_PARAM = re.compile(r"\$\d+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(query: str) -> str:
+    """\
+    Normalize a query so that those differing only in their parameters,
+    literals or formatting are aggregated together.
+    """
+    query = _STRING_LITERAL.sub("?", query)
+    query = _NAMED_PARAM.sub("?", query)
+    query = _POSITIONAL_PARAM.sub("?", query)
+    query = _NUMERIC_LITERAL.sub("?", query)
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def _caller_name(frame: FrameType) -> str:
+    module = frame.f_globals.get("__name__", "")
+    return f"{module.removeprefix('app.')}.{frame.f_code.co_qualname}"
+
+
+def _redact(values: Any) -> Any:
+    # parameter values may be credentials or personal data, so only
+    # their names and types are ever logged
+    if isinstance(values, dict):
+        return {name: type(value).__name__ for name, value in values.items()}
+
+    if isinstance(values, list):
+        return {"rows": len(values)}
+
+    return None
+
+
+class QueryStats:
+    """The latency of a query fingerprint, aggregated since startup."""
+
+    def __init__(self, fingerprint: str) -> None:
+        self.fingerprint = fingerprint
+        self.callers: set[str] = set()
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.recent_times: deque[float] = deque(maxlen=_QUERY_STATS_WINDOW)
+
+    def record(self, caller: str, duration: float) -> None:
+        self.callers.add(caller)
+        self.calls += 1
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+        self.recent_times.append(duration)
+
+    def to_dict(self) -> dict[str, Any]:
+        if len(self.recent_times) > 1:
+            percentiles = statistics.quantiles(
+                self.recent_times,
+                n=100,
+                method="inclusive",
+            )
+            p50, p95, p99 = percentiles[49], percentiles[94], percentiles[98]
+        else:
+            p50 = p95 = p99 = self.max_time
+
+        return {
+            "fingerprint": self.fingerprint,
+            "callers": sorted(self.callers),
+            "calls": self.calls,
+            "total_time": self.total_time,
+            "mean_time": self.total_time / self.calls,
+            "max_time": self.max_time,
+            "p50_time": p50,
+            "p95_time": p95,
+            "p99_time": p99,
+        }
+
+
+class ReadLatencies:
+    """\
+    The latencies of recent first attempts at a query fingerprint's reads,
+    from which the delay before hedging them is taken.
+
+    Attempts which lose to their hedge are cancelled, and recorded as the
+    time they had taken by then; a lower bound on their latency. Excluding
+    them would leave only the faster reads, and the hedge delay would drift
+    down until most reads were hedged.
+    """
+
+    def __init__(self) -> None:
+        self.samples: deque[float] = deque(maxlen=_HEDGE_SAMPLE_WINDOW)
+        self._cached_hedge_delay: float | None = None
+        self._samples_since_hedge_delay = 0
+
+    def record(self, latency: float) -> None:
+        self.samples.append(latency)
+        self._samples_since_hedge_delay += 1
+
+    def hedge_delay(self, percentile: int) -> float | None:
+        """How long to wait on a read before hedging it, once known."""
+        if len(self.samples) < _MIN_HEDGE_SAMPLES:
+            return None
+
+        # recomputed periodically, rather than sorting the window every read
+        if (
+            self._cached_hedge_delay is None
+            or self._samples_since_hedge_delay >= _MIN_HEDGE_SAMPLES
+        ):
+            self._cached_hedge_delay = statistics.quantiles(
+                self.samples,
+                n=100,
+                method="inclusive",
+            )[percentile - 1]
+            self._samples_since_hedge_delay = 0
+
+        return self._cached_hedge_delay
+
+
+class Query(str):
+    """\
+    A query which is defined once, at import time.
+
+    Its `:name` parameters are compiled to positional form on definition,
+    and the asyncpg backend prepares every query in `QUERIES` on each pooled
+    connection as it is created, so running one skips the parse and plan.
+
+    As a `str`, a `Query` may be passed anywhere plain query text is.
+    """
+
+    positional_query: str
+    param_names: tuple[str, ...]
+
+    def __new__(cls, query: str) -> "Query":
+        self = super().__new__(cls, query)
+        self.positional_query, self.param_names = _compile_query(query)
+        QUERIES.append(self)
+        return self
+
+
+QUERIES: list[Query] = []
+
+
+class PreparedConnection(asyncpg.Connection):
+    """An asyncpg connection holding a prepared statement for each `Query`."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.prepared_statements: dict[
+            str, asyncpg.prepared_stmt.PreparedStatement
+        ] = {}
+
+
+async def _prepare_queries(connection: PreparedConnection) -> None:
+    for query in QUERIES:
+        try:
+            statement = await connection.prepare(query.positional_query)
+        except asyncpg.PostgresError as exc:
+            # the query will still work, it just won't be prepared up front
+            logger.warning("Unable to prepare query", query=query, error=exc)
+            continue
+
+        connection.prepared_statements[query.positional_query] = statement
+
+
+class AsyncpgConnection:
+    """\
+    A connection checked out of an `AsyncpgPool`, with the same query API
+    as a `databases` connection.
+
+    Like a `databases` connection, it may be entered more than once, and is
+    only returned to the pool once every entry has exited.
+    """
+
+    def __init__(self, pool: asyncpg.Pool) -> None:
+        self._pool = pool
+        self._connection: asyncpg.Connection | None = None
+        self._counter = 0
+        self._connection_lock = asyncio.Lock()
+        # asyncpg connections only run one query at a time
+        self._query_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "AsyncpgConnection":
+        async with self._connection_lock:
+            self._counter += 1
+            if self._counter == 1:
+                try:
+                    self._connection = await self._pool.acquire()
+                except BaseException:
+                    self._counter -= 1
+                    raise
+
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        async with self._connection_lock:
+            assert self._connection is not None
+            self._counter -= 1
+            if self._counter == 0:
+                await self._pool.release(self._connection)
+                self._connection = None
+
+    async def fetch_one(
+        self,
+        query: str,
+        values: dict | None = None,
+    ) -> asyncpg.Record | None:
+        return await self._run("fetchrow", query, values)
+
+    async def fetch_all(
+        self,
+        query: str,
+        values: dict | None = None,
+    ) -> list[asyncpg.Record]:
+        return await self._run("fetch", query, values)
+
+    async def fetch_val(self, query: str, values: dict | None = None) -> Any:
+        return await self._run("fetchval", query, values)
+
+    async def execute(self, query: str, values: dict | None = None) -> Any:
+        # matches `databases`, which returns the first value of the result
+        return await self.fetch_val(query, values)
+
+    async def execute_many(self, query: str, values: list) -> None:
+        await self._run("executemany", query, values, many=True)
+
+    async def _run(
+        self,
+        method: str,
+        query: str,
+        values: Any,
+        many: bool = False,
+    ) -> Any:
+        assert self._connection is not None
+        if isinstance(query, Query):
+            positional_query, names = query.positional_query, query.param_names
+        else:
+            positional_query, names = _compile_query(query)
+
+        if many:
+            args = [[_positional_args(names, value) for value in values]]
+        else:
+            args = _positional_args(names, values)
+
+        async with self._query_lock:
+            statements = self._connection.prepared_statements
+            statement = statements.get(positional_query)
+            if statement is not None:
+                try:
+                    return await getattr(statement, method)(*args)
+                except asyncpg.InvalidCachedStatementError:
+                    # the schema has changed under the statement; asyncpg's
+                    # own statement cache re-prepares it from here on
+                    del statements[positional_query]
+
+            return await getattr(self._connection, method)(positional_query, *args)
+
+    def transaction(self, **kwargs: Any) -> asyncpg.transaction.Transaction:
+        # `force_rollback` is handled by `ServiceTransaction`, for both backends
+        assert self._connection is not None
+        return self._connection.transaction(**kwargs)
+
+
+class AsyncpgPool:
+    """\
+    A pool of connections made directly with asyncpg.
+
+    Skips the query compilation and result wrapping done by `databases`,
+    converting `:name` parameters to positional ones with a cache instead.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int,
+        max_size: int,
+        ssl: bool | ssl.SSLContext,
+        init: Callable[[asyncpg.Connection], Awaitable[None]] | None = None,
+    ) -> None:
+        # asyncpg has no notion of sqlalchemy-style drivers (`+asyncpg`)
+        scheme, rest = dsn.split("://", maxsplit=1)
+        self.dsn = f"{scheme.split('+')[0]}://{rest}"
+        self.min_size = min_size
+        self.max_size = max_size
+        self.ssl = ssl
+        self.init = init
+        self._pool: asyncpg.Pool | None = None
+
+    @property
+    def is_connected(self) -> bool:
+        return self._pool is not None
+
+    async def connect(self) -> None:
+        if self._pool is not None:
+            return
+
+        self._pool = await asyncpg.create_pool(
+            dsn=self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            ssl=self.ssl,
+            connection_class=PreparedConnection,
+            init=self._init_connection,
+        )
+
+    async def _init_connection(self, connection: PreparedConnection) -> None:
+        if self.init is not None:
+            await self.init(connection)
+
+        await _prepare_queries(connection)
+
+    async def disconnect(self) -> None:
+        if self._pool is None:
+            return
+
+        await self._pool.close()
+        self._pool = None
+
+    def connection(self) -> AsyncpgConnection:
+        assert self._pool is not None, "Pool is not connected"
+        return AsyncpgConnection(self._pool)
+
+    async def fetch_one(
+        self,
+        query: str,
+        values: dict | None = None,
+    ) -> asyncpg.Record | None:
+        async with self.connection() as connection:
+            return await connection.fetch_one(query, values)
+
+    async def fetch_val(self, query: str, values: dict | None = None) -> Any:
+        async with self.connection() as connection:
+            return await connection.fetch_val(query, values)
+
+
+Pool = Database | AsyncpgPool
 
 
 def _create_pool(
@@ -13,8 +463,133 @@ def _create_pool(
     min_pool_size: int,
     max_pool_size: int,
     ssl: bool | ssl.SSLContext,
-) -> Database:
-    return Database(url=dsn, min_size=min_pool_size, max_size=max_pool_size, ssl=ssl)
+    backend: Literal["databases", "asyncpg"] = "databases",
+    init: Callable[[asyncpg.Connection], Awaitable[None]] | None = None,
+) -> Pool:
+    if backend == "asyncpg":
+        return AsyncpgPool(
+            dsn=dsn,
+            min_size=min_pool_size,
+            max_size=max_pool_size,
+            ssl=ssl,
+            init=init,
+        )
+    elif backend == "databases":
+        # options which `databases` doesn't recognise are passed through
+        # to `asyncpg.create_pool`
+        return Database(
+            url=dsn,
+            min_size=min_pool_size,
+            max_size=max_pool_size,
+            ssl=ssl,
+            init=init,
+        )
+    else:
+        raise ValueError(f"Unknown database backend: {backend}")
+
+
+class CheckoutTimeoutError(Exception):
+    """No connection became available in the pool within the timeout."""
+
+
+class PoolMetrics:
+    """\
+    Checkout latency, occupancy and connection churn of a single pool,
+    exported under the pool's name.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        # connections currently open, and how many of those are checked out
+        self.size = 0
+        self.in_use = 0
+
+    async def connection_opened(self, connection: asyncpg.Connection) -> None:
+        # the pool's `init` hook, called for each connection it opens
+        POOL_CONNECTIONS_OPENED.labels(self.name).inc()
+        self.size += 1
+        connection.add_termination_listener(self._connection_closed)
+        self._update_gauges()
+
+    def _connection_closed(self, connection: asyncpg.Connection) -> None:
+        POOL_CONNECTIONS_CLOSED.labels(self.name).inc()
+        self.size -= 1
+        self._update_gauges()
+
+    def checked_out(self, duration: float) -> None:
+        POOL_CHECKOUT_SECONDS.labels(self.name).observe(duration)
+        self.in_use += 1
+        self._update_gauges()
+
+    def checkout_timed_out(self) -> None:
+        POOL_CHECKOUT_TIMEOUTS.labels(self.name).inc()
+
+    def released(self) -> None:
+        self.in_use -= 1
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        POOL_CONNECTIONS_IN_USE.labels(self.name).set(self.in_use)
+        POOL_CONNECTIONS_IDLE.labels(self.name).set(max(self.size - self.in_use, 0))
+
+
+class MeteredConnection:
+    """\
+    A pool connection which records its checkout in its pool's metrics,
+    and gives up with `CheckoutTimeoutError` after `checkout_timeout`.
+
+    Like the connection it wraps, it may be entered more than once, and
+    only the outermost entry checks a connection out of the pool.
+    """
+
+    def __init__(
+        self,
+        connection: Connection | AsyncpgConnection,
+        metrics: PoolMetrics,
+        checkout_timeout: float | None = None,
+    ) -> None:
+        self._connection = connection
+        self._metrics = metrics
+        self._checkout_timeout = checkout_timeout
+        self._counter = 0
+        self._lock = asyncio.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connection, name)
+
+    async def __aenter__(self) -> "MeteredConnection":
+        async with self._lock:
+            if self._counter > 0:
+                await self._connection.__aenter__()
+                self._counter += 1
+                return self
+
+            start_time = time.perf_counter()
+            try:
+                async with asyncio.timeout(self._checkout_timeout):
+                    await self._connection.__aenter__()
+            except TimeoutError:
+                self._metrics.checkout_timed_out()
+                raise CheckoutTimeoutError(
+                    f"No {self._metrics.name} database connection available "
+                    f"within {self._checkout_timeout}s",
+                ) from None
+
+            self._metrics.checked_out(time.perf_counter() - start_time)
+            self._counter += 1
+            return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        async with self._lock:
+            await self._connection.__aexit__(*args)
+            self._counter -= 1
+            if self._counter == 0:
+                self._metrics.released()
+
+
+def _record_to_dict(record: Any) -> dict[str, Any]:
+    # `databases` wraps sqlalchemy rows, while asyncpg records are mappings
+    return dict(getattr(record, "_mapping", record))
 
 
 # TODO: refactor this to support dialect/driver separation,
@@ -30,17 +605,238 @@ def dsn(
     return f"{scheme}://{user}:{password}@{host}:{port}/{database}"
 
 
+def parse_lsn(lsn: str) -> int:
+    """Parse a postgres WAL location (e.g. `16/B374D848`) into an integer."""
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+class ReadConsistency:
+    """\
+    The WAL position a request's reads must observe.
+
+    Clients which write receive the primary's WAL position as a token, and
+    send it back with later requests. Their reads are then served only by
+    replicas which have replayed past that position, and by the primary
+    otherwise. Reads after a write within the same request always
+    go to the primary.
+    """
+
+    def __init__(self, min_lsn: int | None = None) -> None:
+        self.min_lsn = min_lsn
+        self.written = False
+
+
+class ServiceTransaction:
+    """\
+    A transaction on the write pool.
+
+    Until it is committed or rolled back, every query made through the
+    `ServiceDatabase` which created it (from the same task) runs on the
+    transaction's connection, rather than checking out its own.
+
+    May be used either as `async with db.transaction():`, or as
+    `transaction = await db.transaction()` followed by an explicit
+    `commit()` or `rollback()`. With `force_rollback`, leaving the `async
+    with` block rolls the transaction back, even without an exception.
+    """
+
+    def __init__(
+        self,
+        database: "ServiceDatabase",
+        *,
+        force_rollback: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        self._database = database
+        self._force_rollback = force_rollback
+        self._kwargs = kwargs
+        self._connection: MeteredConnection | None = None
+        self._transaction: Transaction | asyncpg.transaction.Transaction | None = None
+        self._token: Token[MeteredConnection | None] | None = None
+
+    def __await__(self) -> Generator[Any, None, "ServiceTransaction"]:
+        return self.start().__await__()
+
+    async def __aenter__(self) -> "ServiceTransaction":
+        return await self.start()
+
+    async def __aexit__(
+        self,
+        exc_type: Type[BaseException] | None,
+        exc_value: None | BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if exc_type is None and not self._force_rollback:
+            await self.commit()
+        else:
+            await self.rollback()
+
+    async def start(self) -> "ServiceTransaction":
+        # nested transactions share the outer transaction's connection,
+        # and are run as savepoints on it
+        self._connection = self._database._connection()
+        await self._connection.__aenter__()
+
+        try:
+            self._transaction = self._connection.transaction(**self._kwargs)
+            await self._transaction.start()
+        except BaseException:
+            await self._connection.__aexit__()
+            raise
+
+        self._token = self._database._bound_connection.set(self._connection)
+        self._database._mark_written()
+        return self
+
+    async def commit(self) -> None:
+        assert self._transaction is not None
+        try:
+            await self._transaction.commit()
+        finally:
+            await self._finish()
+
+    async def rollback(self) -> None:
+        assert self._transaction is not None
+        try:
+            await self._transaction.rollback()
+        finally:
+            await self._finish()
+
+    async def _finish(self) -> None:
+        assert self._connection is not None and self._token is not None
+        self._database._bound_connection.reset(self._token)
+        await self._connection.__aexit__()
+
+
+# a replica which has replayed everything it has received is not lagging,
+# however long ago its last replayed transaction was
+_REPLICA_STATUS_QUERY = """\
+    SELECT pg_last_wal_replay_lsn()::text AS replayed_lsn,
+           CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp())
+            END AS lag
+"""
+
+
+# errors which mean a replica itself is unusable, rather than the query.
+# `databases` lets asyncpg's errors through unwrapped, so these cover both
+# backends.
+_REPLICA_UNAVAILABLE_ERRORS = (
+    OSError,  # including `TimeoutError`
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.AdminShutdownError,
+    asyncpg.CrashShutdownError,
+)
+
+
+def _cancel(task: asyncio.Task[Any]) -> None:
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()  # the losing read's failure is of no interest
+
+
+class Replica:
+    """A read replica's pool, along with its load and replication state."""
+
+    def __init__(self, pool: Pool, metrics: PoolMetrics) -> None:
+        self.pool = pool
+        self.metrics = metrics
+        self.healthy = False
+        # queries currently running on this replica
+        self.outstanding = 0
+        # the latest WAL position this replica is known to have replayed;
+        # `None` if the pool is not a replica at all, and so always current
+        self.replayed_lsn: int | None = 0
+
+    def has_replayed(self, lsn: int) -> bool:
+        return self.replayed_lsn is None or self.replayed_lsn >= lsn
+
+
 class ServiceDatabase:
+    """\
+    Divides queries between a primary and its read replicas.
+
+    Reads are balanced across healthy replicas, to whichever currently has
+    the fewest queries outstanding, and fall back to the primary when none
+    are available. Replicas are health checked periodically; those which
+    are unreachable or lag by more than `max_replica_lag` seconds are
+    ejected, and re-admitted once they recover.
+
+    With `hedge_reads`, a read which is still running after the
+    `hedge_percentile`th percentile of recent read latencies is repeated
+    on a second replica, and the first result to arrive is used.
+
+    Every query is timed, and attributed to the function which issued it.
+    Latencies are aggregated by query fingerprint in `query_stats`, and
+    queries slower than `slow_query_threshold` seconds are logged.
+    """
+
     def __init__(
         self,
-        read_dsn: str,
+        read_dsns: list[str],
         write_dsn: str,
         min_pool_size: int,
         max_pool_size: int,
         ssl: bool | ssl.SSLContext,
+        backend: Literal["databases", "asyncpg"] = "databases",
+        health_check_interval: float = 5.0,
+        max_replica_lag: float = 10.0,
+        hedge_reads: bool = False,
+        hedge_percentile: int = 95,
+        checkout_timeout: float | None = None,
+        slow_query_threshold: float | None = None,
     ) -> None:
-        self.read_pool = _create_pool(read_dsn, min_pool_size, max_pool_size, ssl)
-        self.write_pool = _create_pool(write_dsn, min_pool_size, max_pool_size, ssl)
+        self.replicas = []
+        for index, read_dsn in enumerate(read_dsns):
+            metrics = PoolMetrics(f"read-{index}")
+            pool = _create_pool(
+                read_dsn,
+                min_pool_size,
+                max_pool_size,
+                ssl,
+                backend,
+                init=metrics.connection_opened,
+            )
+            self.replicas.append(Replica(pool, metrics))
+
+        self.write_pool_metrics = PoolMetrics("write")
+        self.write_pool = _create_pool(
+            write_dsn,
+            min_pool_size,
+            max_pool_size,
+            ssl,
+            backend,
+            init=self.write_pool_metrics.connection_opened,
+        )
+        self.checkout_timeout = checkout_timeout
+        self.slow_query_threshold = slow_query_threshold
+        self.query_stats: dict[str, QueryStats] = {}
+        self.health_check_interval = health_check_interval
+        self.max_replica_lag = max_replica_lag
+        self.hedge_reads = hedge_reads
+        self.hedge_percentile = hedge_percentile
+
+        # recent replica read latencies by query fingerprint, from which
+        # each query's hedge delay is taken
+        self.read_latencies: dict[str, ReadLatencies] = {}
+
+        self._health_check_task: asyncio.Task[None] | None = None
+
+        # the connection of the transaction in progress, if any
+        self._bound_connection: ContextVar[MeteredConnection | None] = ContextVar(
+            "bound_connection",
+            default=None,
+        )
+
+        # the consistency requirements of the request in progress, if any
+        self._consistency: ContextVar[ReadConsistency | None] = ContextVar(
+            "consistency",
+            default=None,
+        )
 
     async def __aenter__(self) -> "ServiceDatabase":
         await self.connect()
@@ -54,62 +850,432 @@ class ServiceDatabase:
     ) -> None:
         await self.disconnect()
 
-    def connection(self) -> Connection:
-        return self.read_pool.connection()
+    @property
+    def read_pools(self) -> list[Pool]:
+        return [replica.pool for replica in self.replicas]
+
+    def connection(self) -> MeteredConnection:
+        replica = self._least_loaded_replica(self._healthy_replicas())
+        if replica is None:
+            return self._checkout(self.write_pool, self.write_pool_metrics)
+
+        return self._checkout(replica.pool, replica.metrics)
 
     def transaction(
         self,
         *,
         force_rollback: bool = False,
         **kwargs: Any,
-    ) -> Transaction:
-        return self.write_pool.transaction(
-            force_rollback=force_rollback,
-            **kwargs,
+    ) -> ServiceTransaction:
+        return ServiceTransaction(self, force_rollback=force_rollback, **kwargs)
+
+    def track_consistency(self, token: str | None = None) -> ReadConsistency:
+        """\
+        Begin tracking read consistency for the current request, given the
+        consistency token sent by the client (if any).
+        """
+        min_lsn = None
+        if token is not None:
+            try:
+                min_lsn = parse_lsn(token)
+            except ValueError:
+                pass  # a malformed token only costs the client consistency
+
+        consistency = ReadConsistency(min_lsn)
+        self._consistency.set(consistency)
+        return consistency
+
+    async def consistency_token(self, consistency: ReadConsistency) -> str | None:
+        """The token to return to the client, if the request wrote anything."""
+        if not consistency.written:
+            return None
+
+        lsn = await self.write_pool.fetch_val("SELECT pg_current_wal_lsn()::text")
+        return lsn
+
+    def _mark_written(self) -> None:
+        consistency = self._consistency.get()
+        if consistency is not None:
+            consistency.written = True
+
+    def _healthy_replicas(self) -> list[Replica]:
+        return [replica for replica in self.replicas if replica.healthy]
+
+    def _least_loaded_replica(self, replicas: list[Replica]) -> Replica | None:
+        if not replicas:
+            return None
+
+        # ties are broken randomly, so that load spreads evenly when idle
+        return min(replicas, key=lambda r: (r.outstanding, random.random()))
+
+    async def _choose_replica(
+        self,
+        exclude: Replica | None = None,
+    ) -> Replica | None:
+        """The replica to serve a read from, or `None` to use the primary."""
+        if self._bound_connection.get() is not None:
+            # the transaction's connection is used regardless
+            return None
+
+        replicas = [
+            replica for replica in self._healthy_replicas() if replica is not exclude
+        ]
+
+        consistency = self._consistency.get()
+        if consistency is None:
+            return self._least_loaded_replica(replicas)
+
+        if consistency.written:
+            return None
+
+        if consistency.min_lsn is None:
+            return self._least_loaded_replica(replicas)
+
+        min_lsn = consistency.min_lsn
+        caught_up = [replica for replica in replicas if replica.has_replayed(min_lsn)]
+        if caught_up:
+            return self._least_loaded_replica(caught_up)
+
+        # our view of the replicas' positions may be out of date
+        replica = self._least_loaded_replica(replicas)
+        if replica is None:
+            return None
+
+        replayed_lsn = await replica.pool.fetch_val(
+            "SELECT pg_last_wal_replay_lsn()::text",
+        )
+        replica.replayed_lsn = (
+            parse_lsn(replayed_lsn) if replayed_lsn is not None else None
+        )
+        return replica if replica.has_replayed(min_lsn) else None
+
+    async def _run(
+        self,
+        query: Callable[[MeteredConnection], Awaitable[T]],
+        write: bool,
+        query_fingerprint: str,
+    ) -> T:
+        # reads may be served by a replica. statements which modify data
+        # and return rows (e.g. `INSERT ... RETURNING`) must be declared
+        # with `write=True`, so that they are sent to the primary.
+        if write:
+            self._mark_written()
+            replica = None
+        else:
+            replica = await self._choose_replica()
+
+        if replica is None:
+            async with self._connection() as connection:
+                return await query(connection)
+
+        try:
+            if self.hedge_reads:
+                read_latencies = self._read_latencies(query_fingerprint)
+                if read_latencies is not None:
+                    return await self._run_hedged(replica, query, read_latencies)
+
+            return await self._run_on(replica, query)
+        except _REPLICA_UNAVAILABLE_ERRORS:
+            # the replica has been ejected; the read is retried once, on
+            # another replica or the primary, rather than failed
+            fallback_replica = await self._choose_replica(exclude=replica)
+            if fallback_replica is not None:
+                return await self._run_on(fallback_replica, query)
+
+            async with self._connection() as connection:
+                return await query(connection)
+
+    async def _run_on(
+        self,
+        replica: Replica,
+        query: Callable[[MeteredConnection], Awaitable[T]],
+    ) -> T:
+        READS.inc()
+        replica.outstanding += 1
+        try:
+            async with self._checkout(replica.pool, replica.metrics) as connection:
+                return await query(connection)
+        except _REPLICA_UNAVAILABLE_ERRORS as exc:
+            logger.warning("Database replica unavailable, ejecting", error=exc)
+            replica.healthy = False
+            raise
+        finally:
+            replica.outstanding -= 1
+
+    def _read_latencies(self, query_fingerprint: str) -> ReadLatencies | None:
+        read_latencies = self.read_latencies.get(query_fingerprint)
+        if (
+            read_latencies is None
+            and len(self.read_latencies) < _MAX_QUERY_FINGERPRINTS
+        ):
+            read_latencies = self.read_latencies[query_fingerprint] = ReadLatencies()
+        return read_latencies
+
+    async def _run_sampled(
+        self,
+        replica: Replica,
+        query: Callable[[MeteredConnection], Awaitable[T]],
+        read_latencies: ReadLatencies,
+    ) -> T:
+        """Run a read's first attempt, recording its latency for hedging."""
+        start_time = time.perf_counter()
+        try:
+            result = await self._run_on(replica, query)
+        except asyncio.CancelledError:
+            # lost to its hedge; it would have taken at least this long
+            read_latencies.record(time.perf_counter() - start_time)
+            raise
+
+        read_latencies.record(time.perf_counter() - start_time)
+        return result
+
+    async def _run_hedged(
+        self,
+        replica: Replica,
+        query: Callable[[MeteredConnection], Awaitable[T]],
+        read_latencies: ReadLatencies,
+    ) -> T:
+        """\
+        Run a read on a replica, and if it is slower than usual for its
+        query, run the same read on a second replica and take whichever
+        finishes first.
+        """
+        hedge_delay = read_latencies.hedge_delay(self.hedge_percentile)
+        if hedge_delay is None:
+            return await self._run_sampled(replica, query, read_latencies)
+
+        first = asyncio.create_task(
+            self._run_sampled(replica, query, read_latencies),
         )
+        try:
+            done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+            if done:
+                return first.result()
+
+            hedge_replica = await self._choose_replica(exclude=replica)
+            if hedge_replica is None:
+                return await first
+
+            HEDGED_READS.inc()
+            second = asyncio.create_task(self._run_on(hedge_replica, query))
+            try:
+                pending = {first, second}
+                while True:
+                    done, pending = await asyncio.wait(
+                        pending,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    # a read only fails if both of its attempts fail
+                    succeeded = [task for task in done if task.exception() is None]
+                    if succeeded or not pending:
+                        winner = (succeeded or list(done))[0]
+                        if winner is second:
+                            HEDGED_READ_WINS.inc()
+                        return winner.result()
+            finally:
+                _cancel(second)
+        finally:
+            _cancel(first)
+
+    def _connection(self) -> MeteredConnection:
+        """The transaction's connection if one is bound, else the primary's."""
+        bound_connection = self._bound_connection.get()
+        if bound_connection is not None:
+            return bound_connection
+
+        return self._checkout(self.write_pool, self.write_pool_metrics)
+
+    def _checkout(self, pool: Pool, metrics: PoolMetrics) -> MeteredConnection:
+        return MeteredConnection(pool.connection(), metrics, self.checkout_timeout)
 
     async def connect(self) -> None:
-        await self.read_pool.connect()
         await self.write_pool.connect()
 
+        if self.replicas:
+            # an unreachable replica must not prevent startup; it will be
+            # picked up by a later health check once it is reachable
+            await self.check_replicas()
+            self._health_check_task = asyncio.create_task(self._check_replicas())
+
     async def disconnect(self) -> None:
-        await self.read_pool.disconnect()
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+            self._health_check_task = None
+
+        for replica in self.replicas:
+            if replica.pool.is_connected:
+                await replica.pool.disconnect()
+            replica.healthy = False
+
         await self.write_pool.disconnect()
 
+    async def _check_replica(self, replica: Replica) -> bool:
+        try:
+            if not replica.pool.is_connected:
+                await replica.pool.connect()
+
+            status = await asyncio.wait_for(
+                replica.pool.fetch_one(_REPLICA_STATUS_QUERY),
+                timeout=self.health_check_interval,
+            )
+        except Exception as exc:
+            logger.warning("Database replica health check failed", error=exc)
+            return False
+
+        assert status is not None
+        status = _record_to_dict(status)
+        replayed_lsn = status["replayed_lsn"]
+        replica.replayed_lsn = (
+            parse_lsn(replayed_lsn) if replayed_lsn is not None else None
+        )
+
+        # a replica which isn't replaying anything is either the primary
+        # itself, or one which has yet to receive any changes
+        lag = status["lag"]
+        return lag is None or lag <= self.max_replica_lag
+
+    async def check_replicas(self) -> None:
+        healthy = await asyncio.gather(
+            *(self._check_replica(replica) for replica in self.replicas),
+        )
+
+        if sum(healthy) != len(self._healthy_replicas()):
+            logger.info(
+                "Database replica health changed",
+                healthy=sum(healthy),
+                total=len(self.replicas),
+            )
+
+        for replica, is_healthy in zip(self.replicas, healthy):
+            replica.healthy = is_healthy
+
+    async def _check_replicas(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self.check_replicas()
+            except Exception as exc:  # pragma: no cover
+                logger.error("Unable to check database replica health", error=exc)
+
+    async def _run_timed(
+        self,
+        query: str,
+        values: Any,
+        run: Callable[[MeteredConnection], Awaitable[T]],
+        write: bool,
+    ) -> T:
+        # the function which called `fetch_one` (etc.), which in turn
+        # called us, e.g. `repositories.accounts.fetch_many`
+        caller = _caller_name(sys._getframe(2))
+
+        start_time = time.perf_counter()
+        try:
+            return await self._run(run, write, fingerprint(query))
+        finally:
+            self._record_query(caller, query, values, time.perf_counter() - start_time)
+
+    def _record_query(
+        self,
+        caller: str,
+        query: str,
+        values: Any,
+        duration: float,
+    ) -> None:
+        QUERY_SECONDS.labels(caller).observe(duration)
+
+        query_fingerprint = fingerprint(query)
+        stats = self.query_stats.get(query_fingerprint)
+        if stats is None and len(self.query_stats) < _MAX_QUERY_FINGERPRINTS:
+            stats = self.query_stats[query_fingerprint] = QueryStats(
+                query_fingerprint,
+            )
+        if stats is not None:
+            stats.record(caller, duration)
+
+        if (
+            self.slow_query_threshold is not None
+            and duration >= self.slow_query_threshold
+        ):
+            logger.warning(
+                "Slow database query",
+                caller=caller,
+                query=query_fingerprint,
+                duration=duration,
+                params=_redact(values),
+            )
+
+    def query_stats_summary(self) -> list[dict[str, Any]]:
+        """Latency stats for each query fingerprint, by total time spent."""
+        return sorted(
+            (stats.to_dict() for stats in self.query_stats.values()),
+            key=lambda stats: stats["total_time"],
+            reverse=True,
+        )
+
     async def fetch_one(
         self,
         query: str,
         values: dict | None = None,
+        *,
+        write: bool = False,
     ) -> dict[str, Any] | None:
-        async with self.read_pool.connection() as connection:
-            rec = await connection.fetch_one(query, values)
+        rec = await self._run_timed(
+            query,
+            values,
+            lambda connection: connection.fetch_one(query, values),
+            write,
+        )
 
-        return dict(rec._mapping) if rec is not None else None
+        return _record_to_dict(rec) if rec is not None else None
 
     async def fetch_all(
         self,
         query: str,
         values: dict | None = None,
+        *,
+        write: bool = False,
     ) -> list[dict[str, Any]]:
-        async with self.read_pool.connection() as connection:
-            recs = await connection.fetch_all(query, values)
+        recs = await self._run_timed(
+            query,
+            values,
+            lambda connection: connection.fetch_all(query, values),
+            write,
+        )
 
-        return [dict(rec._mapping) for rec in recs]
+        return [_record_to_dict(rec) for rec in recs]
 
-    async def fetch_val(self, query: str, values: dict | None = None) -> Any:
-        async with self.read_pool.connection() as connection:
-            val = await connection.fetch_val(query, values)
+    async def fetch_val(
+        self,
+        query: str,
+        values: dict | None = None,
+        *,
+        write: bool = False,
+    ) -> Any:
+        val = await self._run_timed(
+            query,
+            values,
+            lambda connection: connection.fetch_val(query, values),
+            write,
+        )
 
         return val
 
     async def execute(self, query: str, values: dict | None = None) -> Any:
-        async with self.write_pool.connection() as connection:
-            result = await connection.execute(query, values)
+        result = await self._run_timed(
+            query,
+            values,
+            lambda connection: connection.execute(query, values),
+            write=True,
+        )
 
         return result
 
     async def execute_many(self, query: str, values: list) -> None:
-        async with self.write_pool.connection() as connection:
-            await connection.execute_many(query, values)
+        await self._run_timed(
+            query,
+            values,
+            lambda connection: connection.execute_many(query, values),
+            write=True,
+        )
 
         return None
@@ -1 +1,329 @@
-# TODO: write a class to divide read & write calls between primary & replicas
+import asyncio
+import itertools
+import time
+from collections.abc import Awaitable
+from collections.abc import Callable
+from typing import Any
+from typing import TypeVar
+
+import redis.asyncio as aioredis
+from app.common import logger
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from prometheus_client import Histogram
+from redis.asyncio.cluster import RedisCluster
+from redis.exceptions import ConnectionError
+from redis.exceptions import TimeoutError
+
+T = TypeVar("T")
+
+POOL_CHECKOUT_SECONDS = Histogram(
+    "redis_pool_checkout_seconds",
+    "Time spent waiting to check a connection out of a redis pool",
+    ["pool"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+)
+POOL_CHECKOUT_TIMEOUTS = Counter(
+    "redis_pool_checkout_timeouts_total",
+    "Checkouts which gave up waiting for a redis connection",
+    ["pool"],
+)
+POOL_CONNECTIONS_IN_USE = Gauge(
+    "redis_pool_connections_in_use",
+    "Redis connections currently checked out of the pool",
+    ["pool"],
+)
+POOL_CONNECTIONS_IDLE = Gauge(
+    "redis_pool_connections_idle",
+    "Redis connections waiting in the pool",
+    ["pool"],
+)
+POOL_CONNECTIONS_OPENED = Counter(
+    "redis_pool_connections_opened_total",
+    "Redis connections established by the pool, including reconnections",
+    ["pool"],
+)
+
+# commands which are safe to serve from a (possibly slightly stale) replica
+READ_COMMANDS = frozenset(
+    {
+        "exists",
+        "get",
+        "hget",
+        "hgetall",
+        "mget",
+        "pttl",
+        "ttl",
+        "type",
+        "zcard",
+        "zrange",
+        "zrangebyscore",
+    }
+)
+
+
+class MeteredConnectionPool(aioredis.BlockingConnectionPool):
+    """\
+    A connection pool which records checkout latency, occupancy, timeouts
+    and connection churn, exported under the pool's name.
+    """
+
+    def __init__(self, name: str, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.name = name
+
+    async def get_connection(self, *args: Any, **kwargs: Any) -> Any:
+        start_time = time.perf_counter()
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except ConnectionError as exc:
+            # raised from a timeout when no connection became available,
+            # as opposed to the connection itself failing
+            if isinstance(exc.__cause__, asyncio.TimeoutError):
+                POOL_CHECKOUT_TIMEOUTS.labels(self.name).inc()
+            raise
+
+        POOL_CHECKOUT_SECONDS.labels(self.name).observe(
+            time.perf_counter() - start_time,
+        )
+        self._update_gauges()
+        return connection
+
+    async def release(self, connection: Any) -> None:
+        await super().release(connection)
+        self._update_gauges()
+
+    def make_connection(self) -> Any:
+        connection = super().make_connection()
+        connection.register_connect_callback(self._connection_opened)
+        return connection
+
+    def _connection_opened(self, connection: Any) -> None:
+        POOL_CONNECTIONS_OPENED.labels(self.name).inc()
+
+    def _update_gauges(self) -> None:
+        POOL_CONNECTIONS_IN_USE.labels(self.name).set(len(self._in_use_connections))
+        POOL_CONNECTIONS_IDLE.labels(self.name).set(
+            len(self._available_connections),
+        )
+
+
+class ReadPipeline:
+    """\
+    A non-transactional pipeline of read commands, executed on a replica.
+
+    Commands are buffered rather than bound to a connection up front, so
+    that the whole pipeline can be replayed on the primary if the replica
+    fails mid-flight.
+    """
+
+    def __init__(self, redis: "ServiceRedis") -> None:
+        self._redis = redis
+        self._commands: list[tuple[str, tuple[Any, ...], dict[str, Any]]] = []
+
+    async def __aenter__(self) -> "ReadPipeline":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        self._commands.clear()
+
+    def __getattr__(self, name: str) -> Callable[..., "ReadPipeline"]:
+        if name not in READ_COMMANDS:
+            raise AttributeError(f"{name} is not a read command")
+
+        def queue(*args: Any, **kwargs: Any) -> "ReadPipeline":
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self, raise_on_error: bool = True) -> list[Any]:
+        async def execute_on(client: aioredis.Redis) -> list[Any]:
+            async with client.pipeline(transaction=False) as pipe:
+                for name, args, kwargs in self._commands:
+                    getattr(pipe, name)(*args, **kwargs)
+                return await pipe.execute(raise_on_error=raise_on_error)
+
+        return await self._redis.read(execute_on)
+
+
+class ServiceRedis:
+    """\
+    Divides redis calls between a primary and its replicas.
+
+    Commands in `READ_COMMANDS` (and `scan`) are served by a healthy replica,
+    and fall back to the primary when no replica is available or the chosen
+    replica fails. Everything else - writes, scripts, transactions and
+    pub/sub - goes to the primary.
+
+    The primary may also be a `RedisCluster`, which routes each command to
+    the node owning its keys; multi-key reads and scans are then fanned out
+    across slots and nodes here.
+    """
+
+    def __init__(
+        self,
+        primary: aioredis.Redis | RedisCluster,
+        replicas: list[aioredis.Redis] | None = None,
+        health_check_interval: float = 5.0,
+    ) -> None:
+        self.primary = primary
+        self.replicas = replicas or []
+        self.health_check_interval = health_check_interval
+
+        self._healthy_replicas = list(self.replicas)
+        self._round_robin = itertools.count()
+        self._health_check_task: asyncio.Task[None] | None = None
+
+    async def __aenter__(self) -> "ServiceRedis":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.disconnect()
+
+    def __getattr__(self, name: str) -> Any:
+        if name in READ_COMMANDS:
+
+            async def read_command(*args: Any, **kwargs: Any) -> Any:
+                return await self.read(
+                    lambda client: getattr(client, name)(*args, **kwargs),
+                )
+
+            return read_command
+
+        return getattr(self.primary, name)
+
+    @property
+    def cluster(self) -> bool:
+        return isinstance(self.primary, RedisCluster)
+
+    async def connect(self) -> None:
+        await self.primary.initialize()
+
+        if self.replicas:
+            await self.check_replicas()
+            self._health_check_task = asyncio.create_task(self._check_replicas())
+
+    async def disconnect(self) -> None:
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+            self._health_check_task = None
+
+        await self.primary.aclose()
+        for replica in self.replicas:
+            await replica.aclose()
+
+    def read_pipeline(self) -> ReadPipeline:
+        return ReadPipeline(self)
+
+    async def mget(self, keys: list[Any]) -> list[Any]:
+        if self.cluster:
+            # the keys may hash to several slots; this issues one MGET per
+            # slot and reassembles the results in the order of `keys`
+            return await self.primary.mget_nonatomic(keys)
+
+        return await self.read(lambda client: client.mget(keys))
+
+    def scan_node_count(self) -> int:
+        """The number of nodes which must be scanned to cover the keyspace."""
+        if self.cluster:
+            return len(self.primary.get_primaries())
+
+        return 1
+
+    async def scan(
+        self,
+        cursor: int = 0,
+        match: str | None = None,
+        count: int | None = None,
+        node: int = 0,
+    ) -> tuple[int, list[bytes]]:
+        """\
+        Scan the keys held by a single node.
+
+        In cluster mode, `node` indexes the cluster's primaries (in a stable
+        order), and the whole keyspace is covered by scanning each of nodes
+        `0` through `scan_node_count() - 1` to completion.
+        """
+        if self.cluster:
+            primary = sorted(self.primary.get_primaries(), key=lambda n: n.name)[node]
+            cursors, keys = await self.primary.scan(
+                cursor=cursor,
+                match=match,
+                count=count,
+                target_nodes=primary,
+            )
+            return cursors[primary.name], keys
+
+        # scan cursors are only meaningful on the node which issued them,
+        # so scans always go to the same replica while it remains healthy
+        replica = self._healthy_replicas[0] if self._healthy_replicas else None
+        return await self._read_from(
+            replica,
+            lambda client: client.scan(cursor=cursor, match=match, count=count),
+        )
+
+    async def read(self, command: Callable[[aioredis.Redis], Awaitable[T]]) -> T:
+        """Run a read-only command on a replica, or the primary if none are up."""
+        return await self._read_from(self._next_replica(), command)
+
+    def _next_replica(self) -> aioredis.Redis | None:
+        if not self._healthy_replicas:
+            return None
+
+        index = next(self._round_robin) % len(self._healthy_replicas)
+        return self._healthy_replicas[index]
+
+    async def _read_from(
+        self,
+        replica: aioredis.Redis | None,
+        command: Callable[[aioredis.Redis], Awaitable[T]],
+    ) -> T:
+        if replica is None:
+            return await command(self.primary)
+
+        try:
+            return await command(replica)
+        except (ConnectionError, TimeoutError) as exc:
+            logger.warning("Redis replica unavailable, failing over", error=exc)
+            self._eject(replica)
+            return await command(self.primary)
+
+    def _eject(self, replica: aioredis.Redis) -> None:
+        if replica in self._healthy_replicas:
+            self._healthy_replicas.remove(replica)
+
+    async def _is_healthy(self, replica: aioredis.Redis) -> bool:
+        try:
+            replication = await replica.info("replication")
+        except (ConnectionError, TimeoutError):
+            return False
+
+        # a replica which has lost its primary is serving stale data
+        return replication.get("master_link_status") == "up"
+
+    async def check_replicas(self) -> None:
+        healthy = await asyncio.gather(
+            *(self._is_healthy(replica) for replica in self.replicas),
+        )
+        healthy_replicas = [
+            replica for replica, is_healthy in zip(self.replicas, healthy) if is_healthy
+        ]
+
+        if len(healthy_replicas) != len(self._healthy_replicas):
+            logger.info(
+                "Redis replica health changed",
+                healthy=len(healthy_replicas),
+                total=len(self.replicas),
+            )
+
+        self._healthy_replicas = healthy_replicas
+
+    async def _check_replicas(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self.check_replicas()
+            except Exception as exc:  # pragma: no cover
+                logger.error("Unable to check redis replica health", error=exc)
@@ -1,11 +1,19 @@
+import asyncio
 import base64
 import ssl
 import time
+from typing import Any
 
+import prometheus_client
 import redis.asyncio as aioredis
 from app.adapters import database
+from app.adapters.redis import MeteredConnectionPool
+from app.adapters.redis import ServiceRedis
 from app.common import logger
+from app.common import security
 from app.common import settings
+from app.repositories import login_attempts as login_attempts_repo
+from app.repositories import sessions as sessions_repo
 from fastapi import FastAPI
 from fastapi import Request
 
@@ -15,14 +23,17 @@ def init_db(api: FastAPI) -> None:
     async def startup_db() -> None:
         logger.info("Starting up database pool")
         service_database = database.ServiceDatabase(
-            read_dsn=database.dsn(
-                scheme=settings.WRITE_DB_SCHEME,
-                user=settings.READ_DB_USER,
-                password=settings.READ_DB_PASS,
-                host=settings.READ_DB_HOST,
-                port=settings.READ_DB_PORT,
-                database=settings.READ_DB_NAME,
-            ),
+            read_dsns=[
+                database.dsn(
+                    scheme=settings.WRITE_DB_SCHEME,
+                    user=settings.READ_DB_USER,
+                    password=settings.READ_DB_PASS,
+                    host=read_db_host,
+                    port=settings.READ_DB_PORT,
+                    database=settings.READ_DB_NAME,
+                )
+                for read_db_host in settings.READ_DB_HOSTS
+            ],
             write_dsn=database.dsn(
                 scheme=settings.WRITE_DB_SCHEME,
                 user=settings.WRITE_DB_USER,
@@ -39,6 +50,13 @@ def init_db(api: FastAPI) -> None:
             )
             if settings.DB_USE_SSL
             else False,
+            backend=settings.DB_BACKEND,
+            health_check_interval=settings.DB_HEALTH_CHECK_INTERVAL,
+            max_replica_lag=settings.DB_MAX_REPLICA_LAG,
+            hedge_reads=settings.DB_HEDGE_READS,
+            hedge_percentile=settings.DB_HEDGE_PERCENTILE,
+            checkout_timeout=settings.DB_POOL_CHECKOUT_TIMEOUT,
+            slow_query_threshold=settings.DB_SLOW_QUERY_THRESHOLD,
         )
         await service_database.connect()
         api.state.db = service_database
@@ -56,30 +74,174 @@ def init_redis(api: FastAPI) -> None:
     @api.on_event("startup")
     async def startup_redis() -> None:
         logger.info("Starting up redis pool")
-        redis = await aioredis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            db=settings.REDIS_DB,
-        )
+        if settings.REDIS_CLUSTER_MODE:
+            # REDIS_HOST is any node, from which the rest of the cluster
+            # is discovered. clusters only have a single database.
+            redis = ServiceRedis(
+                primary=aioredis.RedisCluster(
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                ),
+            )
+        else:
+            replicas = []
+            for index, replica_host in enumerate(settings.REDIS_REPLICA_HOSTS):
+                host, port = replica_host.rsplit(":", maxsplit=1)
+                replicas.append(
+                    aioredis.Redis.from_pool(
+                        MeteredConnectionPool(
+                            name=f"replica-{index}",
+                            host=host,
+                            port=int(port),
+                            db=settings.REDIS_DB,
+                            max_connections=settings.REDIS_MAX_CONNECTIONS,
+                            timeout=settings.REDIS_POOL_TIMEOUT,
+                        ),
+                    ),
+                )
+            redis = ServiceRedis(
+                primary=aioredis.Redis.from_pool(
+                    MeteredConnectionPool(
+                        name="primary",
+                        host=settings.REDIS_HOST,
+                        port=settings.REDIS_PORT,
+                        db=settings.REDIS_DB,
+                        max_connections=settings.REDIS_MAX_CONNECTIONS,
+                        timeout=settings.REDIS_POOL_TIMEOUT,
+                    ),
+                ),
+                replicas=replicas,
+                health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            )
+        await redis.connect()
         api.state.redis = redis
         logger.info("Redis pool started up")
 
     @api.on_event("shutdown")
     async def shutdown_redis() -> None:
         logger.info("Shutting down redis pool")
-        await api.state.redis.close()
+        await api.state.redis.disconnect()
         del api.state.redis
         logger.info("Redis pool shut down")
 
 
+def init_session_cache(api: FastAPI) -> None:
+    @api.on_event("startup")
+    async def startup_session_cache() -> None:
+        logger.info("Starting up session cache invalidation listener")
+        api.state.session_cache_listener = asyncio.create_task(
+            sessions_repo.listen_for_invalidations(api.state.redis),
+        )
+        logger.info("Session cache invalidation listener started up")
+
+    @api.on_event("shutdown")
+    async def shutdown_session_cache() -> None:
+        logger.info("Shutting down session cache invalidation listener")
+        api.state.session_cache_listener.cancel()
+        del api.state.session_cache_listener
+        logger.info("Session cache invalidation listener shut down")
+
+
+def init_session_tokens(api: FastAPI) -> None:
+    if not settings.SESSION_TOKEN_SECRET:
+        return
+
+    @api.on_event("startup")
+    async def startup_session_tokens() -> None:
+        logger.info("Starting up session revocation sync")
+        api.state.session_revocation_sync = asyncio.create_task(
+            sessions_repo.sync_revocations(api.state.redis),
+        )
+        logger.info("Session revocation sync started up")
+
+    @api.on_event("shutdown")
+    async def shutdown_session_tokens() -> None:
+        logger.info("Shutting down session revocation sync")
+        api.state.session_revocation_sync.cancel()
+        del api.state.session_revocation_sync
+        logger.info("Session revocation sync shut down")
+
+
+def init_password_hashing(api: FastAPI) -> None:
+    @api.on_event("startup")
+    async def startup_password_hashing() -> None:
+        logger.info("Starting up password hashing pool")
+        scheduler = security.start_password_hashing(
+            max_workers=settings.PASSWORD_HASHING_WORKERS,
+            memory_budget=settings.PASSWORD_HASHING_MEMORY_BUDGET,
+            max_queue_size=settings.PASSWORD_HASHING_MAX_QUEUE_SIZE,
+        )
+        logger.info(
+            "Password hashing pool started up",
+            max_concurrency=scheduler.max_concurrency,
+        )
+
+    @api.on_event("shutdown")
+    async def shutdown_password_hashing() -> None:
+        logger.info("Shutting down password hashing pool")
+        security.stop_password_hashing()
+        logger.info("Password hashing pool shut down")
+
+
+def init_login_attempts(api: FastAPI) -> None:
+    @api.on_event("startup")
+    async def startup_login_attempts() -> None:
+        logger.info("Starting up login attempt buffer")
+        login_attempts_repo.start_buffering(
+            api.state.db,
+            max_size=settings.LOGIN_ATTEMPT_BUFFER_SIZE,
+            batch_size=settings.LOGIN_ATTEMPT_BATCH_SIZE,
+            flush_interval=settings.LOGIN_ATTEMPT_FLUSH_INTERVAL,
+        )
+        logger.info("Login attempt buffer started up")
+
+    async def shutdown_login_attempts() -> None:
+        logger.info("Shutting down login attempt buffer")
+        await login_attempts_repo.stop_buffering()
+        logger.info("Login attempt buffer shut down")
+
+    # shutdown handlers run in the order they're added, and the buffer
+    # must be written before the database pool is shut down
+    api.router.on_shutdown.insert(0, shutdown_login_attempts)
+
+
+def init_metrics(api: FastAPI) -> None:
+    # registered ahead of the mount, which would otherwise match it
+    @api.get("/metrics/queries", include_in_schema=False)
+    async def query_stats(request: Request) -> list[dict[str, Any]]:
+        return request.app.state.db.query_stats_summary()
+
+    api.mount("/metrics", prometheus_client.make_asgi_app())
+
+
 def init_middlewares(api: FastAPI) -> None:
     # NOTE: these run bottom to top
 
     @api.middleware("http")
     async def add_db_to_request(request: Request, call_next):
-        async with request.app.state.db.connection() as conn:
-            request.state.db = conn
-            response = await call_next(request)
+        # connections are checked out lazily by each query, and returned to
+        # the pool as soon as it completes, rather than held per-request
+        request.state.db = request.app.state.db
+        response = await call_next(request)
+        return response
+
+    @api.middleware("http")
+    async def add_consistency_token(request: Request, call_next):
+        # lets clients read their own writes, even from lagging replicas
+        db = request.app.state.db
+        consistency = db.track_consistency(request.headers.get("X-Consistency-Token"))
+        response = await call_next(request)
+
+        try:
+            consistency_token = await db.consistency_token(consistency)
+        except Exception as exc:
+            # the request's writes have already been committed, so it has
+            # succeeded; the client only loses read-your-writes for a while
+            logger.warning("Unable to create consistency token", error=exc)
+            return response
+
+        if consistency_token is not None:
+            response.headers["X-Consistency-Token"] = consistency_token
         return response
 
     @api.middleware("http")
@@ -108,6 +270,11 @@ def init_api():
 
     init_db(api)
     init_redis(api)
+    init_session_cache(api)
+    init_session_tokens(api)
+    init_password_hashing(api)
+    init_login_attempts(api)
+    init_metrics(api)
     init_middlewares(api)
     init_routes(api)
 
@@ -1,5 +1,5 @@
-import redis.asyncio as aioredis
 from app.adapters import database
+from app.adapters import redis
 from app.common.context import Context
 from fastapi import Request
 
@@ -13,5 +13,5 @@ class RequestContext(Context):
         return self.request.state.db
 
     @property
-    def redis(self) -> aioredis.Redis:
+    def redis(self) -> redis.ServiceRedis:
         return self.request.state.redis
@@ -2,6 +2,7 @@ from uuid import UUID
 
 from app.api.rest.context import RequestContext
 from app.common import responses
+from app.common import settings
 from app.common.errors import ServiceError
 from app.common.responses import Success
 from app.models.accounts import Account
@@ -31,6 +32,13 @@ async def create(
         args.first_name,
         args.last_name,
     )
+    if data is ServiceError.PASSWORD_HASHING_OVERLOADED:
+        return responses.failure(
+            data,
+            "Too many accounts being created, try again shortly",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(settings.PASSWORD_HASHING_RETRY_AFTER)},
+        )
     if isinstance(data, ServiceError):
         return responses.failure(data, "Failed to create account")
 
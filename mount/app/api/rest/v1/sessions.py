@@ -2,11 +2,16 @@ from uuid import UUID
 
 from app.api.rest.context import RequestContext
 from app.common import responses
+from app.common import settings
 from app.common.errors import ServiceError
 from app.common.responses import Success
+from app.models.sessions import CreatedSession
+from app.models.sessions import DeletedSessions
 from app.models.sessions import LoginForm
 from app.models.sessions import Session
+from app.models.sessions import SessionClaims
 from app.models.sessions import SessionUpdate
+from app.models.sessions import TokenForm
 from app.services import sessions
 from fastapi import APIRouter
 from fastapi import Depends
@@ -23,10 +28,10 @@ router = APIRouter(tags=["Sessions"])
 )
 async def create(
     args: LoginForm,
-    cf_connecting_ip: str = Header("CF-Connecting-IP"),
-    user_agent: str = Header("User-Agent"),
+    cf_connecting_ip: str | None = Header(None, alias="CF-Connecting-IP"),
+    user_agent: str = Header("", alias="User-Agent"),
     ctx: RequestContext = Depends(),
-) -> Success[Session]:
+) -> Success[CreatedSession]:
     data = await sessions.create(
         ctx,
         args.phone_number,
@@ -34,10 +39,24 @@ async def create(
         cf_connecting_ip,
         user_agent,
     )
+    if data is ServiceError.PASSWORD_HASHING_OVERLOADED:
+        return responses.failure(
+            data,
+            "Too many logins in progress, try again shortly",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(settings.PASSWORD_HASHING_RETRY_AFTER)},
+        )
+    if data is ServiceError.SESSIONS_LOGIN_THROTTLED:
+        return responses.failure(
+            data,
+            "Too many failed logins, try again later",
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(settings.LOGIN_THROTTLE_WINDOW)},
+        )
     if isinstance(data, ServiceError):
         return responses.failure(data, "Failed to create session")
 
-    resp = Session.from_mapping(data)
+    resp = CreatedSession.from_mapping({**data, "token": sessions.create_token(data)})
     return responses.success(
         content=resp,
         status_code=status.HTTP_201_CREATED,
@@ -47,6 +66,16 @@ async def create(
     )
 
 
+@router.post("/v1/sessions/tokens/verify")
+async def verify_token(args: TokenForm) -> Success[SessionClaims]:
+    data = sessions.verify_token(args.token)
+    if isinstance(data, ServiceError):
+        return responses.failure(data, "Failed to verify session token")
+
+    resp = SessionClaims.from_mapping(data)
+    return responses.success(resp)
+
+
 @router.get("/v1/sessions/{session_id}")
 async def fetch_one(
     session_id: UUID,
@@ -62,21 +91,52 @@ async def fetch_one(
 
 @router.get("/v1/sessions")
 async def fetch_many(
-    page: int = Query(1, ge=1),
+    cursor: str | None = None,
     page_size: int = Query(50, ge=1, le=1000),
     ctx: RequestContext = Depends(),
 ) -> Success[list[Session]]:
-    data = await sessions.fetch_many(ctx, page=page, page_size=page_size)
+    data = await sessions.fetch_many(ctx, cursor=cursor, page_size=page_size)
     if isinstance(data, ServiceError):
         return responses.failure(data, "Failed to get sessions")
 
-    resp = [Session.from_mapping(d) for d in data]
+    page, next_cursor = data
+
+    resp = [Session.from_mapping(d) for d in page]
     return responses.success(
         resp,
         meta={
             "total": len(resp),
             "page_size": page_size,
-            "page": page,
+            "next_cursor": next_cursor,
+        },
+    )
+
+
+@router.get("/v1/accounts/{account_id}/sessions")
+async def fetch_many_for_account(
+    account_id: UUID,
+    cursor: str | None = None,
+    page_size: int = Query(50, ge=1, le=1000),
+    ctx: RequestContext = Depends(),
+) -> Success[list[Session]]:
+    data = await sessions.fetch_many(
+        ctx,
+        account_id=account_id,
+        cursor=cursor,
+        page_size=page_size,
+    )
+    if isinstance(data, ServiceError):
+        return responses.failure(data, "Failed to get sessions")
+
+    page, next_cursor = data
+
+    resp = [Session.from_mapping(d) for d in page]
+    return responses.success(
+        resp,
+        meta={
+            "total": len(resp),
+            "page_size": page_size,
+            "next_cursor": next_cursor,
         },
     )
 
@@ -112,3 +172,14 @@ async def delete(
         return responses.failure(data, "Failed to delete session")
 
     return responses.no_content()
+
+
+@router.delete("/v1/accounts/{account_id}/sessions")
+async def delete_many_for_account(
+    account_id: UUID,
+    ctx: RequestContext = Depends(),
+) -> Success[DeletedSessions]:
+    count = await sessions.delete_many(ctx, account_id)
+
+    resp = DeletedSessions(count=count)
+    return responses.success(resp)
@@ -0,0 +1,72 @@
+import time
+from collections import OrderedDict
+from typing import Generic
+from typing import TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+# keys share generation counters by hash, so that tracking them costs a
+# fixed amount of memory however many keys are invalidated
+_GENERATION_BUCKETS = 4096
+
+
+class TTLCache(Generic[K, V]):
+    """\
+    A bounded, least-recently-used cache with a ttl per entry.
+
+    Invalidating a key bumps its `generation`; a reader may pass the
+    generation of a key it observed before fetching its value to `set`, so
+    that a value fetched concurrently with an invalidation is not cached.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._generations = [0] * _GENERATION_BUCKETS
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def generation(self, key: K) -> int:
+        return self._generations[hash(key) % _GENERATION_BUCKETS]
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(
+        self,
+        key: K,
+        value: V,
+        ttl: float,
+        generation: int | None = None,
+    ) -> None:
+        if self.max_size <= 0 or ttl <= 0:
+            return
+
+        if generation is not None and generation != self.generation(key):
+            return
+
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: K) -> None:
+        self._generations[hash(key) % _GENERATION_BUCKETS] += 1
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._generations = [generation + 1 for generation in self._generations]
+        self._entries.clear()
@@ -1,8 +1,8 @@
 from abc import ABC
 from abc import abstractmethod
 
-import redis.asyncio as aioredis
 from app.adapters import database
+from app.adapters import redis
 
 
 class Context(ABC):
@@ -13,5 +13,5 @@ class Context(ABC):
 
     @property
     @abstractmethod
-    def redis(self) -> aioredis.Redis:
+    def redis(self) -> redis.ServiceRedis:
         ...
@@ -23,8 +23,14 @@ class ServiceError(str, Enum):
     SESSIONS_PHONE_NUMBER_INVALID = "sessions.phone_number_invalid"
     SESSIONS_PASSWORD_INVALID = "sessions.password_invalid"
     SESSIONS_PASSWORD_INCORRECT = "sessions.password_incorrect"
+    SESSIONS_CURSOR_INVALID = "sessions.cursor_invalid"
+    SESSIONS_TOKEN_INVALID = "sessions.token_invalid"
+    SESSIONS_TOKEN_REVOKED = "sessions.token_revoked"
+    SESSIONS_LOGIN_THROTTLED = "sessions.login_throttled"
 
     LOGIN_ATTEMPTS_NOT_FOUND = "login_attempts.attempt_not_found"
     LOGIN_ATTEMPTS_CREATION_FAILED = "login_attempts.creation_failed"
     LOGIN_ATTEMPTS_DELETION_FAILED = "login_attempts.deletion_failed"
     LOGIN_ATTEMPTS_PHONE_NUMBER_INVALID = "login_attempts.phone_number_invalid"
+
+    PASSWORD_HASHING_OVERLOADED = "password_hashing.overloaded"
@@ -1,19 +1,312 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import struct
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from typing import TypeVar
+from uuid import UUID
+
 import argon2
+from app.common import settings
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from prometheus_client import Histogram
 
-ph = argon2.PasswordHasher()
+T = TypeVar("T")
 
+ph = argon2.PasswordHasher(
+    time_cost=settings.PASSWORD_HASH_TIME_COST,
+    memory_cost=settings.PASSWORD_HASH_MEMORY_COST,
+    parallelism=settings.PASSWORD_HASH_PARALLELISM,
+)
 
-def hash_password(password: str | bytes) -> str:
-    return ph.hash(password)
+HASHING_QUEUE_DEPTH = Gauge(
+    "password_hashing_queue_depth",
+    "Password hashes waiting for a hashing slot",
+)
+HASHING_WAIT_SECONDS = Histogram(
+    "password_hashing_wait_seconds",
+    "Time password hashes spent waiting for a hashing slot",
+)
+HASHING_REJECTIONS = Counter(
+    "password_hashing_rejections_total",
+    "Password hashes refused because the hashing queue was full",
+)
 
 
-def verify_password(
-    hashed_password: str | bytes,
-    password: str | bytes,
-) -> bool:
+class HashingOverloadedError(Exception):
+    """The password hashing queue is full."""
+
+
+class HashingScheduler:
+    """\
+    Runs password hashes on a thread pool, admitting at most
+    `max_concurrency` at once and queueing up to `max_queue_size` more.
+
+    Each argon2 hash allocates its `memory_cost` KiB for its duration, and
+    hashes are only admitted while their memory fits in `memory_budget`
+    KiB; verifying a hash made with a higher cost than the current one
+    reserves that hash's own cost. Hashes arriving while the queue is full
+    are refused with `HashingOverloadedError`, rather than left waiting
+    for seconds.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue_size: int,
+        memory_budget: int | None = None,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.memory_budget = memory_budget
+        self.running = 0
+        self.memory_in_use = 0
+
+        # argon2-cffi releases the gil while hashing, so threads suffice
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix="password-hashing",
+        )
+        # admitted in arrival order, so that an expensive hash isn't
+        # starved by cheaper ones arriving after it
+        self._waiters: deque[tuple[int, asyncio.Future[None]]] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _can_start(self, memory_cost: int) -> bool:
+        # a single hash is always admitted, even if it exceeds the budget
+        # by itself, so that it can't wait forever
+        if self.running == 0:
+            return True
+
+        return self.running < self.max_concurrency and (
+            self.memory_budget is None
+            or self.memory_in_use + memory_cost <= self.memory_budget
+        )
+
+    def _start(self, memory_cost: int) -> None:
+        self.running += 1
+        self.memory_in_use += memory_cost
+
+    def _finish(self, memory_cost: int) -> None:
+        self.running -= 1
+        self.memory_in_use -= memory_cost
+
+        while self._waiters and self._can_start(self._waiters[0][0]):
+            waiter_memory_cost, waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._start(waiter_memory_cost)
+                waiter.set_result(None)
+
+        HASHING_QUEUE_DEPTH.set(self.waiting)
+
+    async def _acquire(self, memory_cost: int) -> None:
+        if not self._waiters and self._can_start(memory_cost):
+            self._start(memory_cost)
+            return
+
+        if self.waiting >= self.max_queue_size:
+            HASHING_REJECTIONS.inc()
+            raise HashingOverloadedError()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append((memory_cost, waiter))
+        HASHING_QUEUE_DEPTH.set(self.waiting)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                if (memory_cost, waiter) in self._waiters:
+                    self._waiters.remove((memory_cost, waiter))
+                    HASHING_QUEUE_DEPTH.set(self.waiting)
+            else:
+                # admitted just as we stopped waiting
+                self._finish(memory_cost)
+            raise
+
+    async def run(
+        self,
+        function: Callable[..., T],
+        *args: Any,
+        memory_cost: int = 0,
+    ) -> T:
+        start_time = time.perf_counter()
+        await self._acquire(memory_cost)
+        HASHING_WAIT_SECONDS.observe(time.perf_counter() - start_time)
+
+        # the memory is held until the hash itself finishes, even if we
+        # stop waiting for it, since it is in use until then
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(function, *args)
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._finish, memory_cost),
+        )
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        # hashes in progress finish in the background, rather than blocking
+        # the event loop until they do
+        self._executor.shutdown(wait=False)
+
+
+# until `start_password_hashing` is called, hashes run unbounded on the
+# loop's default executor
+_scheduler: HashingScheduler | None = None
+
+
+def hashing_concurrency(max_workers: int, memory_budget: int) -> int:
+    """\
+    The number of hashes which may run at once within `memory_budget`
+    MiB, using no more than `max_workers` threads.
+    """
+    return max(1, min(max_workers, memory_budget * 1024 // ph.memory_cost))
+
+
+def start_password_hashing(
+    max_workers: int,
+    memory_budget: int,
+    max_queue_size: int,
+) -> HashingScheduler:
+    global _scheduler
+    _scheduler = HashingScheduler(
+        max_concurrency=hashing_concurrency(max_workers, memory_budget),
+        max_queue_size=max_queue_size,
+        memory_budget=memory_budget * 1024,
+    )
+    return _scheduler
+
+
+def stop_password_hashing() -> None:
+    global _scheduler
+    if _scheduler is not None:
+        _scheduler.shutdown()
+        _scheduler = None
+
+
+async def _run_hashing(
+    function: Callable[..., T],
+    *args: Any,
+    memory_cost: int,
+) -> T:
+    if _scheduler is None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, function, *args)
+
+    return await _scheduler.run(function, *args, memory_cost=memory_cost)
+
+
+def hash_memory_cost(hashed_password: str | bytes) -> int:
+    """The memory, in KiB, which verifying a password against a hash uses."""
+    if isinstance(hashed_password, bytes):
+        hashed_password = hashed_password.decode()
+
+    try:
+        return argon2.extract_parameters(hashed_password).memory_cost
+    except argon2.exceptions.InvalidHashError:
+        return ph.memory_cost  # fails without hashing anything
+
+
+def _verify_password(hashed_password: str | bytes, password: str | bytes) -> bool:
     try:
         ph.verify(hashed_password, password)
     except argon2.exceptions.VerifyMismatchError:
         return False
     else:
         return True
+
+
+async def hash_password(password: str | bytes) -> str:
+    """May raise `HashingOverloadedError`."""
+    return await _run_hashing(ph.hash, password, memory_cost=ph.memory_cost)
+
+
+async def verify_password(
+    hashed_password: str | bytes,
+    password: str | bytes,
+) -> bool:
+    """May raise `HashingOverloadedError`."""
+    return await _run_hashing(
+        _verify_password,
+        hashed_password,
+        password,
+        memory_cost=hash_memory_cost(hashed_password),
+    )
+
+
+def password_needs_rehash(hashed_password: str | bytes) -> bool:
+    """Whether a hash was made with parameters other than the current ones."""
+    return ph.check_needs_rehash(hashed_password)
+
+
+# session tokens let a session be checked without a round trip to redis.
+# a token is the urlsafe base64 of a packed payload and its hmac-sha256.
+
+SESSION_TOKEN_VERSION = 1
+
+_SESSION_TOKEN_PAYLOAD = struct.Struct(">B16s16sq")
+_SESSION_TOKEN_SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def create_session_token(
+    secret: bytes,
+    session_id: UUID,
+    account_id: UUID,
+    expires_at: datetime,
+) -> str:
+    payload = _SESSION_TOKEN_PAYLOAD.pack(
+        SESSION_TOKEN_VERSION,
+        session_id.bytes,
+        account_id.bytes,
+        (expires_at - _EPOCH) // _MICROSECOND,
+    )
+    signature = hmac.digest(secret, payload, hashlib.sha256)
+    return base64.urlsafe_b64encode(payload + signature).decode().rstrip("=")
+
+
+def verify_session_token(secret: bytes, token: str) -> dict[str, Any] | None:
+    """\
+    Return the claims of a session token, or `None` if it is malformed,
+    carries an invalid signature, or has expired.
+    """
+    try:
+        raw_token = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except ValueError:
+        return None
+
+    if len(raw_token) != _SESSION_TOKEN_PAYLOAD.size + _SESSION_TOKEN_SIGNATURE_SIZE:
+        return None
+
+    payload = raw_token[: _SESSION_TOKEN_PAYLOAD.size]
+    signature = raw_token[_SESSION_TOKEN_PAYLOAD.size :]
+    if not hmac.compare_digest(
+        hmac.digest(secret, payload, hashlib.sha256),
+        signature,
+    ):
+        return None
+
+    version, session_id, account_id, expires_at = _SESSION_TOKEN_PAYLOAD.unpack(payload)
+    if version != SESSION_TOKEN_VERSION:
+        return None
+
+    expires_at = _EPOCH + expires_at * _MICROSECOND
+    if expires_at <= datetime.now():
+        return None
+
+    return {
+        "session_id": str(UUID(bytes=session_id)),
+        "account_id": str(UUID(bytes=account_id)),
+        "expires_at": expires_at.isoformat(),
+    }
@@ -22,7 +22,8 @@ LOG_LEVEL = int(os.environ["LOG_LEVEL"])
 READ_DB_SCHEME = os.environ["READ_DB_SCHEME"]
 READ_DB_USER = os.environ["READ_DB_USER"]
 READ_DB_PASS = os.environ["READ_DB_PASS"]
-READ_DB_HOST = os.environ["READ_DB_HOST"]
+READ_DB_HOST = os.environ["READ_DB_HOST"]  # host,host,... for several replicas
+READ_DB_HOSTS = [host for host in READ_DB_HOST.split(",") if host]
 READ_DB_PORT = int(os.environ["READ_DB_PORT"])
 READ_DB_NAME = os.environ["READ_DB_NAME"]
 
@@ -38,7 +39,64 @@ DB_CA_CERTIFICATE = os.environ["DB_CA_CERTIFICATE"]
 MIN_DB_POOL_SIZE = int(os.environ["MIN_DB_POOL_SIZE"])
 MAX_DB_POOL_SIZE = int(os.environ["MAX_DB_POOL_SIZE"])
 DB_USE_SSL = os.environ["DB_USE_SSL"].lower() == "true"
+DB_HEALTH_CHECK_INTERVAL = float(os.environ["DB_HEALTH_CHECK_INTERVAL"])
+DB_MAX_REPLICA_LAG = float(os.environ["DB_MAX_REPLICA_LAG"])  # seconds
+DB_HEDGE_READS = os.environ["DB_HEDGE_READS"].lower() == "true"
+DB_HEDGE_PERCENTILE = int(os.environ["DB_HEDGE_PERCENTILE"])
+# databases | asyncpg. repository queries are only prepared ahead of time
+# on asyncpg; `databases` parses and plans every query each time it runs
+DB_BACKEND = os.environ["DB_BACKEND"]
+DB_POOL_CHECKOUT_TIMEOUT = float(os.environ["DB_POOL_CHECKOUT_TIMEOUT"])  # seconds
+DB_SLOW_QUERY_THRESHOLD = float(os.environ["DB_SLOW_QUERY_THRESHOLD"])  # seconds
 
 REDIS_HOST = os.environ["REDIS_HOST"]
 REDIS_PORT = int(os.environ["REDIS_PORT"])
 REDIS_DB = int(os.environ["REDIS_DB"])
+REDIS_REPLICA_HOSTS = [  # host:port,host:port,...
+    host for host in os.environ["REDIS_REPLICA_HOSTS"].split(",") if host
+]
+REDIS_HEALTH_CHECK_INTERVAL = float(os.environ["REDIS_HEALTH_CHECK_INTERVAL"])
+REDIS_CLUSTER_MODE = os.environ["REDIS_CLUSTER_MODE"].lower() == "true"
+REDIS_MAX_CONNECTIONS = int(os.environ["REDIS_MAX_CONNECTIONS"])
+REDIS_POOL_TIMEOUT = float(os.environ["REDIS_POOL_TIMEOUT"])  # seconds
+
+SESSION_CACHE_MAX_SIZE = int(os.environ["SESSION_CACHE_MAX_SIZE"])
+SESSION_CACHE_TTL = float(os.environ["SESSION_CACHE_TTL"])  # seconds
+SESSION_SLIDING_EXPIRY = os.environ["SESSION_SLIDING_EXPIRY"].lower() == "true"
+# the fraction of a session's lifetime after which reads extend it
+SESSION_SLIDING_EXPIRY_THRESHOLD = float(
+    os.environ["SESSION_SLIDING_EXPIRY_THRESHOLD"],
+)
+# signed session tokens are issued only while a secret is configured
+SESSION_TOKEN_SECRET = os.environ["SESSION_TOKEN_SECRET"].encode()
+SESSION_TOKEN_REVOCATION_SYNC_INTERVAL = float(  # seconds
+    os.environ["SESSION_TOKEN_REVOCATION_SYNC_INTERVAL"],
+)
+
+# argon2 parameters; see benchmarks/password_hashing.py for choosing them.
+# hashes made with other parameters are upgraded as their owners log in.
+PASSWORD_HASH_TIME_COST = int(os.environ["PASSWORD_HASH_TIME_COST"])
+PASSWORD_HASH_MEMORY_COST = int(os.environ["PASSWORD_HASH_MEMORY_COST"])  # KiB
+PASSWORD_HASH_PARALLELISM = int(os.environ["PASSWORD_HASH_PARALLELISM"])
+PASSWORD_HASHING_WORKERS = int(os.environ["PASSWORD_HASHING_WORKERS"])
+# MiB; bounds concurrent hashes by the memory cost of each
+PASSWORD_HASHING_MEMORY_BUDGET = int(os.environ["PASSWORD_HASHING_MEMORY_BUDGET"])
+PASSWORD_HASHING_MAX_QUEUE_SIZE = int(os.environ["PASSWORD_HASHING_MAX_QUEUE_SIZE"])
+PASSWORD_HASHING_RETRY_AFTER = int(
+    os.environ["PASSWORD_HASHING_RETRY_AFTER"]
+)  # seconds
+
+# failed logins within the window, after which further logins are refused
+LOGIN_THROTTLE_WINDOW = int(os.environ["LOGIN_THROTTLE_WINDOW"])  # seconds
+LOGIN_THROTTLE_MAX_PHONE_NUMBER_FAILURES = int(
+    os.environ["LOGIN_THROTTLE_MAX_PHONE_NUMBER_FAILURES"]
+)
+LOGIN_THROTTLE_MAX_IP_ADDRESS_FAILURES = int(
+    os.environ["LOGIN_THROTTLE_MAX_IP_ADDRESS_FAILURES"]
+)
+
+LOGIN_ATTEMPT_BUFFER_SIZE = int(os.environ["LOGIN_ATTEMPT_BUFFER_SIZE"])
+LOGIN_ATTEMPT_BATCH_SIZE = int(os.environ["LOGIN_ATTEMPT_BATCH_SIZE"])
+LOGIN_ATTEMPT_FLUSH_INTERVAL = float(  # seconds
+    os.environ["LOGIN_ATTEMPT_FLUSH_INTERVAL"],
+)
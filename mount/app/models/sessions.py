@@ -15,6 +15,10 @@ class SessionUpdate(BaseModel):
     expires_at: datetime | None
 
 
+class TokenForm(BaseModel):
+    token: str
+
+
 # output models
 
 
@@ -24,3 +28,18 @@ class Session(BaseModel):
     expires_at: datetime
     created_at: datetime
     updated_at: datetime
+
+
+class CreatedSession(Session):
+    # a signed token, if enabled, which can be verified without redis
+    token: str | None
+
+
+class SessionClaims(BaseModel):
+    session_id: UUID
+    account_id: UUID
+    expires_at: datetime
+
+
+class DeletedSessions(BaseModel):
+    count: int
@@ -1,6 +1,7 @@
 from typing import Any
 from uuid import UUID
 
+from app.adapters.database import Query
 from app.common.context import Context
 from app.models import Status
 
@@ -9,6 +10,81 @@ READ_PARAMS = """\
     status, created_at, updated_at
 """
 
+CREATE_QUERY = Query(
+    f"""\
+    INSERT INTO accounts (account_id, phone_number, first_name,
+                          last_name, status, created_at, updated_at)
+         VALUES (:account_id, :phone_number, :first_name,
+                 :last_name, :status, NOW(), NOW())
+      RETURNING {READ_PARAMS}
+"""
+)
+
+FETCH_ONE_QUERY = Query(
+    f"""\
+    SELECT {READ_PARAMS}
+      FROM accounts
+     WHERE account_id = COALESCE(:account_id, account_id)
+       AND phone_number = COALESCE(:phone_number, phone_number)
+       AND status = :status
+"""
+)
+
+# lookups by a single key get their own queries, since a prepared
+# statement's generic plan can't use an index through `COALESCE`
+FETCH_ONE_BY_ID_QUERY = Query(
+    f"""\
+    SELECT {READ_PARAMS}
+      FROM accounts
+     WHERE account_id = :account_id
+       AND status = :status
+"""
+)
+
+FETCH_ONE_BY_PHONE_NUMBER_QUERY = Query(
+    f"""\
+    SELECT {READ_PARAMS}
+      FROM accounts
+     WHERE phone_number = :phone_number
+       AND status = :status
+"""
+)
+
+# a null limit & offset return every row
+FETCH_MANY_QUERY = Query(
+    f"""\
+    SELECT {READ_PARAMS}
+      FROM accounts
+     WHERE status = :status
+     LIMIT :limit
+    OFFSET :offset
+"""
+)
+
+PARTIAL_UPDATE_QUERY = Query(
+    f"""\
+    UPDATE accounts
+       SET phone_number = COALESCE(:phone_number, phone_number),
+           first_name = COALESCE(:first_name, first_name),
+           last_name = COALESCE(:last_name, last_name),
+           updated_at = NOW()
+     WHERE account_id = :account_id
+       AND status = :status
+ RETURNING {READ_PARAMS}
+"""
+)
+
+DELETE_QUERY = Query(
+    f"""\
+    UPDATE accounts
+       SET status = :new_status,
+           updated_at = NOW()
+     WHERE account_id = :account_id
+       AND status = :old_status
+ RETURNING {READ_PARAMS}
+"""
+)
+
 
 async def create(
     ctx: Context,
@@ -18,13 +94,6 @@ async def create(
     last_name: str,
     status: Status = Status.ACTIVE,
 ) -> dict[str, Any]:
-    query = f"""\
-        INSERT INTO accounts (account_id, phone_number, first_name,
-                              last_name, status, created_at, updated_at)
-             VALUES (:account_id, :phone_number, :first_name,
-                     :last_name, :status, NOW(), NOW())
-          RETURNING {READ_PARAMS}
-    """
     params: dict[str, Any] = {
         "account_id": account_id,
         "phone_number": phone_number,
@@ -32,7 +101,7 @@ async def create(
         "last_name": last_name,
         "status": status,
     }
-    rec = await ctx.db.fetch_one(query, params)
+    rec = await ctx.db.fetch_one(CREATE_QUERY, params, write=True)
     assert rec is not None
     return rec
 
@@ -43,19 +112,25 @@ async def fetch_one(
     phone_number: str | None = None,
     status: Status = Status.ACTIVE,
 ) -> dict[str, Any] | None:
-    query = f"""\
-        SELECT {READ_PARAMS}
-          FROM accounts
-         WHERE account_id = COALESCE(:account_id, account_id)
-           AND phone_number = COALESCE(:phone_number, phone_number)
-           AND status = :status
-    """
-    params: dict[str, Any] = {
-        "account_id": account_id,
-        "phone_number": phone_number,
-        "status": status,
-    }
-    rec = await ctx.db.fetch_one(query, params)
+    if phone_number is None and account_id is not None:
+        params: dict[str, Any] = {
+            "account_id": account_id,
+            "status": status,
+        }
+        rec = await ctx.db.fetch_one(FETCH_ONE_BY_ID_QUERY, params)
+    elif account_id is None and phone_number is not None:
+        params = {
+            "phone_number": phone_number,
+            "status": status,
+        }
+        rec = await ctx.db.fetch_one(FETCH_ONE_BY_PHONE_NUMBER_QUERY, params)
+    else:
+        params = {
+            "account_id": account_id,
+            "phone_number": phone_number,
+            "status": status,
+        }
+        rec = await ctx.db.fetch_one(FETCH_ONE_QUERY, params)
     return rec
 
 
@@ -65,22 +140,15 @@ async def fetch_many(
     page_size: int | None = None,
     status: Status = Status.ACTIVE,
 ) -> list[dict[str, Any]]:
-    query = f"""\
-        SELECT {READ_PARAMS}
-          FROM accounts
-         WHERE status = :status
-    """
     params: dict[str, Any] = {
         "status": status,
+        "limit": None,
+        "offset": None,
     }
     if page is not None and page_size is not None:
-        query += """\
-            LIMIT :limit
-           OFFSET :offset
-        """
         params["limit"] = page_size
         params["offset"] = (page - 1) * page_size
-    recs = await ctx.db.fetch_all(query, params)
+    recs = await ctx.db.fetch_all(FETCH_MANY_QUERY, params)
     return recs
 
 
@@ -92,16 +160,6 @@ async def partial_update(
     last_name: str | None = None,
     status: Status = Status.ACTIVE,
 ) -> dict[str, Any] | None:
-    query = f"""\
-        UPDATE accounts
-           SET phone_number = COALESCE(:phone_number, phone_number),
-               first_name = COALESCE(:first_name, first_name),
-               last_name = COALESCE(:last_name, last_name),
-               updated_at = NOW()
-         WHERE account_id = :account_id
-           AND status = :status
-     RETURNING {READ_PARAMS}
-    """
     params: dict[str, Any] = {
         "account_id": account_id,
         "phone_number": phone_number,
@@ -109,7 +167,7 @@ async def partial_update(
         "last_name": last_name,
         "status": status,
     }
-    rec = await ctx.db.fetch_one(query, params)
+    rec = await ctx.db.fetch_one(PARTIAL_UPDATE_QUERY, params, write=True)
     return rec
 
 
@@ -118,18 +176,10 @@ async def delete(
     account_id: UUID,
     status: Status = Status.ACTIVE,
 ) -> dict[str, Any] | None:
-    query = f"""\
-        UPDATE accounts
-           SET status = :new_status,
-               updated_at = NOW()
-         WHERE account_id = :account_id
-           AND status = :old_status
-     RETURNING {READ_PARAMS}
-    """
     params: dict[str, Any] = {
         "account_id": account_id,
         "new_status": Status.DELETED,
         "old_status": status,
     }
-    rec = await ctx.db.fetch_one(query, params)
+    rec = await ctx.db.fetch_one(DELETE_QUERY, params, write=True)
     return rec
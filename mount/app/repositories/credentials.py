@@ -1,6 +1,7 @@
 from typing import Any
 from uuid import UUID
 
+from app.adapters.database import Query
 from app.common.context import Context
 from app.models import Status
 
@@ -9,6 +10,107 @@ READ_PARAMS = """\
     status, created_at, updated_at
 """
 
+CREATE_QUERY = Query(
+    f"""\
+    INSERT INTO credentials (credentials_id, account_id, identifier,
+                             secret, status, created_at, updated_at)
+         VALUES (:credentials_id, :account_id, :identifier,
+                 :secret, :status, NOW(), NOW())
+      RETURNING {READ_PARAMS}
+"""
+)
+
+FETCH_ONE_QUERY = Query(
+    f"""\
+    SELECT {READ_PARAMS}
+      FROM credentials
+     WHERE credentials_id = COALESCE(:credentials_id, credentials_id)
+       AND identifier = COALESCE(:identifier, identifier)
+       AND status = :status
+"""
+)
+
+# lookups by a single key get their own queries, since a prepared
+# statement's generic plan can't use an index through `COALESCE`
+FETCH_ONE_BY_ID_QUERY = Query(
+    f"""\
+    SELECT {READ_PARAMS}
+      FROM credentials
+     WHERE credentials_id = :credentials_id
+       AND status = :status
+"""
+)
+
+# used by every login
+FETCH_ONE_BY_IDENTIFIER_QUERY = Query(
+    f"""\
+    SELECT {READ_PARAMS}
+      FROM credentials
+     WHERE identifier = :identifier
+       AND status = :status
+"""
+)
+
+# a null limit & offset return every row
+FETCH_MANY_QUERY = Query(
+    f"""\
+    SELECT {READ_PARAMS}
+      FROM credentials
+     WHERE account_id = COALESCE(:account_id, account_id)
+       AND status = :status
+     LIMIT :limit
+    OFFSET :offset
+"""
+)
+
+FETCH_MANY_BY_ACCOUNT_ID_QUERY = Query(
+    f"""\
+    SELECT {READ_PARAMS}
+      FROM credentials
+     WHERE account_id = :account_id
+       AND status = :status
+     LIMIT :limit
+    OFFSET :offset
+"""
+)
+
+PARTIAL_UPDATE_QUERY = Query(
+    f"""\
+    UPDATE credentials
+       SET identifier = COALESCE(:identifier, identifier),
+           secret = COALESCE(:secret, secret),
+           updated_at = NOW()
+     WHERE credentials_id = :credentials_id
+       AND status = :status
+ RETURNING {READ_PARAMS}
+"""
+)
+
+# only replaces the secret it was read alongside, so that a concurrent
+# password change isn't overwritten
+REPLACE_SECRET_QUERY = Query(
+    f"""\
+    UPDATE credentials
+       SET secret = :new_secret,
+           updated_at = NOW()
+     WHERE credentials_id = :credentials_id
+       AND secret = :old_secret
+       AND status = :status
+ RETURNING {READ_PARAMS}
+"""
+)
+
+DELETE_QUERY = Query(
+    f"""\
+    UPDATE credentials
+       SET status = :new_status,
+           updated_at = NOW()
+     WHERE credentials_id = :credentials_id
+       AND status = :old_status
+ RETURNING {READ_PARAMS}
+"""
+)
+
 
 async def create(
     ctx: Context,
@@ -18,13 +120,6 @@ async def create(
     secret: str,
     status: Status = Status.ACTIVE,
 ) -> dict[str, Any]:
-    query = f"""\
-        INSERT INTO credentials (credentials_id, account_id, identifier,
-                                 secret, status, created_at, updated_at)
-             VALUES (:credentials_id, :account_id, :identifier,
-                     :secret, :status, NOW(), NOW())
-          RETURNING {READ_PARAMS}
-    """
     params: dict[str, Any] = {
         "credentials_id": credentials_id,
         "account_id": account_id,
@@ -32,7 +127,7 @@ async def create(
         "secret": secret,
         "status": status,
     }
-    rec = await ctx.db.fetch_one(query, params)
+    rec = await ctx.db.fetch_one(CREATE_QUERY, params, write=True)
     assert rec is not None
     return rec
 
@@ -43,19 +138,25 @@ async def fetch_one(
     identifier: str | None = None,
     status: Status = Status.ACTIVE,
 ) -> dict[str, Any] | None:
-    query = f"""\
-        SELECT {READ_PARAMS}
-          FROM credentials
-         WHERE credentials_id = COALESCE(:credentials_id, credentials_id)
-           AND identifier = COALESCE(:identifier, identifier)
-           AND status = :status
-    """
-    params: dict[str, Any] = {
-        "credentials_id": credentials_id,
-        "identifier": identifier,
-        "status": status,
-    }
-    rec = await ctx.db.fetch_one(query, params)
+    if identifier is None and credentials_id is not None:
+        params: dict[str, Any] = {
+            "credentials_id": credentials_id,
+            "status": status,
+        }
+        rec = await ctx.db.fetch_one(FETCH_ONE_BY_ID_QUERY, params)
+    elif credentials_id is None and identifier is not None:
+        params = {
+            "identifier": identifier,
+            "status": status,
+        }
+        rec = await ctx.db.fetch_one(FETCH_ONE_BY_IDENTIFIER_QUERY, params)
+    else:
+        params = {
+            "credentials_id": credentials_id,
+            "identifier": identifier,
+            "status": status,
+        }
+        rec = await ctx.db.fetch_one(FETCH_ONE_QUERY, params)
     return rec
 
 
@@ -66,31 +167,22 @@ async def fetch_many(
     page_size: int | None = None,
     status: Status = Status.ACTIVE,
 ) -> list[dict[str, Any]]:
-    query = f"""\
-        SELECT {READ_PARAMS}
-          FROM credentials
-         WHERE account_id = COALESCE(:account_id, account_id)
-           AND status = :status
-    """
     params: dict[str, Any] = {
         "account_id": account_id,
         "status": status,
+        "limit": None,
+        "offset": None,
     }
     if page is not None and page_size is not None:
-        query += """\
-            LIMIT :limit
-           OFFSET :offset
-        """
         params["limit"] = page_size
         params["offset"] = (page - 1) * page_size
-    recs = await ctx.db.fetch_all(query, params)
+    if account_id is not None:
+        recs = await ctx.db.fetch_all(FETCH_MANY_BY_ACCOUNT_ID_QUERY, params)
+    else:
+        recs = await ctx.db.fetch_all(FETCH_MANY_QUERY, params)
     return recs
 
 
-# credentials_id, account_id, identifier, secret,
-# status, created_at, updated_at
-
-
 async def partial_update(
     ctx: Context,
     credentials_id: UUID,
@@ -98,22 +190,30 @@ async def partial_update(
     secret: str | None = None,
     status: Status = Status.ACTIVE,
 ) -> dict[str, Any] | None:
-    query = f"""\
-        UPDATE credentials
-           SET identifier = COALESCE(:identifier, identifier),
-               secret = COALESCE(:secret, secret),
-               updated_at = NOW()
-         WHERE credentials_id = :credentials_id
-           AND status = :status
-     RETURNING {READ_PARAMS}
-    """
     params: dict[str, Any] = {
         "credentials_id": credentials_id,
         "identifier": identifier,
         "secret": secret,
         "status": status,
     }
-    rec = await ctx.db.fetch_one(query, params)
+    rec = await ctx.db.fetch_one(PARTIAL_UPDATE_QUERY, params, write=True)
+    return rec
+
+
+async def replace_secret(
+    ctx: Context,
+    credentials_id: UUID,
+    old_secret: str,
+    new_secret: str,
+    status: Status = Status.ACTIVE,
+) -> dict[str, Any] | None:
+    params: dict[str, Any] = {
+        "credentials_id": credentials_id,
+        "old_secret": old_secret,
+        "new_secret": new_secret,
+        "status": status,
+    }
+    rec = await ctx.db.fetch_one(REPLACE_SECRET_QUERY, params, write=True)
     return rec
 
 
@@ -122,18 +222,10 @@ async def delete(
     credentials_id: UUID,
     status: Status = Status.ACTIVE,
 ) -> dict[str, Any] | None:
-    query = f"""\
-        UPDATE credentials
-           SET status = :new_status,
-               updated_at = NOW()
-         WHERE credentials_id = :credentials_id
-           AND status = :old_status
-     RETURNING {READ_PARAMS}
-    """
     params: dict[str, Any] = {
         "credentials_id": credentials_id,
         "new_status": Status.DELETED,
         "old_status": status,
     }
-    rec = await ctx.db.fetch_one(query, params)
+    rec = await ctx.db.fetch_one(DELETE_QUERY, params, write=True)
     return rec
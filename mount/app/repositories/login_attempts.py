@@ -1,12 +1,83 @@
+import asyncio
+from datetime import datetime
 from typing import Any
 from uuid import UUID
 
+from app.adapters.database import Query
+from app.adapters.database import ServiceDatabase
+from app.common import logger
 from app.common.context import Context
+from prometheus_client import Counter
+from prometheus_client import Gauge
+
+LOGIN_ATTEMPTS_BUFFERED = Gauge(
+    "login_attempts_buffered",
+    "Login attempts waiting to be written",
+)
+LOGIN_ATTEMPTS_FLUSHED = Counter(
+    "login_attempts_flushed_total",
+    "Login attempts written in batches",
+)
+LOGIN_ATTEMPTS_DROPPED = Counter(
+    "login_attempts_dropped_total",
+    "Login attempts which were never written",
+    ["reason"],
+)
 
 READ_PARAMS = """\
     login_attempt_id, phone_number, ip_address, user_agent, created_at
 """
 
+CREATE_QUERY = Query(
+    f"""\
+    INSERT INTO login_attempts (login_attempt_id, phone_number, ip_address,
+                                user_agent)
+         VALUES (:login_attempt_id, :phone_number, :ip_address,
+                 :user_agent)
+      RETURNING {READ_PARAMS}
+"""
+)
+
+FETCH_ONE_QUERY = Query(
+    f"""\
+    SELECT {READ_PARAMS}
+      FROM login_attempts
+     WHERE login_attempt_id = :login_attempt_id
+"""
+)
+
+# attempts are written some time after they're made, so carry their time.
+# a batch is a single statement, with a column per array parameter, rather
+# than a statement per row; `CAST` rather than `::` keeps the parameter
+# names intact for sqlalchemy.
+CREATE_MANY_QUERY = Query(
+    """\
+    INSERT INTO login_attempts (login_attempt_id, phone_number, ip_address,
+                                user_agent, created_at, updated_at)
+         SELECT login_attempt_id, phone_number, ip_address,
+                user_agent, created_at, created_at
+           FROM unnest(CAST(:login_attempt_ids AS UUID[]),
+                       CAST(:phone_numbers AS TEXT[]),
+                       CAST(:ip_addresses AS TEXT[]),
+                       CAST(:user_agents AS TEXT[]),
+                       CAST(:created_ats AS TIMESTAMP[]))
+             AS login_attempt (login_attempt_id, phone_number, ip_address,
+                               user_agent, created_at)
+"""
+)
+
+# a null limit & offset return every row
+FETCH_MANY_QUERY = Query(
+    f"""\
+    SELECT {READ_PARAMS}
+      FROM login_attempts
+     WHERE phone_number = COALESCE(:phone_number, phone_number)
+       AND ip_address = COALESCE(:ip_address, ip_address)
+     LIMIT :limit
+    OFFSET :offset
+"""
+)
+
 
 async def create(
     ctx: Context,
@@ -15,13 +86,6 @@ async def create(
     ip_address: str,
     user_agent: str,
 ) -> dict[str, Any]:
-    query = f"""\
-        INSERT INTO login_attempts (login_attempt_id, phone_number, ip_address,
-                                    user_agent)
-             VALUES (:login_attempt_id, :phone_number, :ip_address,
-                     :user_agent)
-          RETURNING {READ_PARAMS}
-    """
     params: dict[str, Any] = {
         "login_attempt_id": login_attempt_id,
         "phone_number": phone_number,
@@ -29,25 +93,174 @@ async def create(
         "user_agent": user_agent,
     }
 
-    rec = await ctx.db.fetch_one(query, params)
+    rec = await ctx.db.fetch_one(CREATE_QUERY, params, write=True)
     assert rec is not None
     return rec
 
 
+async def create_many(
+    db: ServiceDatabase, login_attempts: list[dict[str, Any]]
+) -> None:
+    params: dict[str, Any] = {
+        "login_attempt_ids": [row["login_attempt_id"] for row in login_attempts],
+        "phone_numbers": [row["phone_number"] for row in login_attempts],
+        "ip_addresses": [row["ip_address"] for row in login_attempts],
+        "user_agents": [row["user_agent"] for row in login_attempts],
+        "created_ats": [row["created_at"] for row in login_attempts],
+    }
+    await db.execute(CREATE_MANY_QUERY, params)
+
+
+class LoginAttemptBuffer:
+    """\
+    Holds login attempts in memory, writing them in batches of up to
+    `batch_size` once a batch is full, or every `flush_interval` seconds.
+
+    At most `max_size` attempts are held; attempts made while the buffer
+    is full, or whose batch fails to be written, are dropped and counted
+    rather than slowing down logins.
+    """
+
+    def __init__(
+        self,
+        db: ServiceDatabase,
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+    ) -> None:
+        self.db = db
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._login_attempts: list[dict[str, Any]] = []
+        self._batch_ready = asyncio.Event()
+        self._stopping = False
+        self._task: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._login_attempts)
+
+    def add(
+        self,
+        login_attempt_id: UUID,
+        phone_number: str,
+        ip_address: str,
+        user_agent: str,
+    ) -> bool:
+        if len(self._login_attempts) >= self.max_size:
+            LOGIN_ATTEMPTS_DROPPED.labels("buffer_full").inc()
+            return False
+
+        self._login_attempts.append(
+            {
+                "login_attempt_id": login_attempt_id,
+                "phone_number": phone_number,
+                "ip_address": ip_address,
+                "user_agent": user_agent,
+                "created_at": datetime.now(),
+            },
+        )
+        LOGIN_ATTEMPTS_BUFFERED.set(len(self._login_attempts))
+
+        if len(self._login_attempts) >= self.batch_size:
+            self._batch_ready.set()
+
+        return True
+
+    async def flush(self) -> None:
+        while self._login_attempts:
+            batch = self._login_attempts[: self.batch_size]
+            del self._login_attempts[: self.batch_size]
+            LOGIN_ATTEMPTS_BUFFERED.set(len(self._login_attempts))
+
+            try:
+                await create_many(self.db, batch)
+            except Exception as exc:
+                LOGIN_ATTEMPTS_DROPPED.labels("flush_failed").inc(len(batch))
+                logger.warning(
+                    "Unable to write login attempts",
+                    count=len(batch),
+                    error=exc,
+                )
+            else:
+                LOGIN_ATTEMPTS_FLUSHED.inc(len(batch))
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(
+                    self._batch_ready.wait(),
+                    timeout=self.flush_interval,
+                )
+            except asyncio.TimeoutError:
+                pass
+
+            self._batch_ready.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop flushing periodically, and write what remains."""
+        self._stopping = True
+        self._batch_ready.set()
+        if self._task is not None:
+            # let an in-progress batch finish, rather than cancelling it
+            await self._task
+            self._task = None
+
+        await self.flush()
+
+
+# until `start_buffering` is called, attempts are written as they're made
+_buffer: LoginAttemptBuffer | None = None
+
+
+def start_buffering(
+    db: ServiceDatabase,
+    max_size: int,
+    batch_size: int,
+    flush_interval: float,
+) -> LoginAttemptBuffer:
+    global _buffer
+    _buffer = LoginAttemptBuffer(db, max_size, batch_size, flush_interval)
+    _buffer.start()
+    return _buffer
+
+
+async def stop_buffering() -> None:
+    global _buffer
+    if _buffer is not None:
+        await _buffer.stop()
+        _buffer = None
+
+
+async def record(
+    ctx: Context,
+    login_attempt_id: UUID,
+    phone_number: str,
+    ip_address: str,
+    user_agent: str,
+) -> None:
+    """Record a login attempt, without waiting for it to be written."""
+    if _buffer is None:
+        await create(ctx, login_attempt_id, phone_number, ip_address, user_agent)
+        return
+
+    _buffer.add(login_attempt_id, phone_number, ip_address, user_agent)
+
+
 async def fetch_one(
     ctx: Context,
     login_attempt_id: UUID | None = None,
 ) -> dict[str, Any] | None:
-    query = f"""\
-        SELECT {READ_PARAMS}
-          FROM login_attempts
-         WHERE login_attempt_id = :login_attempt_id
-    """
     params: dict[str, Any] = {
         "login_attempt_id": login_attempt_id,
     }
 
-    rec = await ctx.db.fetch_one(query, params)
+    rec = await ctx.db.fetch_one(FETCH_ONE_QUERY, params)
 
     if rec is None:
         return None
@@ -62,26 +275,17 @@ async def fetch_many(
     page: int | None = None,
     page_size: int | None = None,
 ) -> list[dict[str, Any]]:
-    query = f"""\
-        SELECT {READ_PARAMS}
-          FROM login_attempts
-         WHERE phone_number = COALESCE(:phone_number, phone_number)
-           AND ip_address = COALESCE(:ip_address, ip_address)
-    """
     params: dict[str, Any] = {
         "phone_number": phone_number,
         "ip_address": ip_address,
+        "limit": None,
+        "offset": None,
     }
 
     if page is not None and page_size is not None:
-        query += """\
-             LIMIT :limit
-            OFFSET :offset
-        """
-
         params["limit"] = page_size
         params["offset"] = (page - 1) * page_size
 
-    recs = await ctx.db.fetch_all(query, params)
+    recs = await ctx.db.fetch_all(FETCH_MANY_QUERY, params)
 
     return recs
@@ -0,0 +1,99 @@
+import time
+import uuid
+
+from app.common import settings
+from app.common.context import Context
+
+# login attempts are kept as sorted sets, scored by the time of each
+# attempt, per phone number and per ip address. an attempt is recorded
+# before its password is verified, and forgotten if it doesn't fail, so
+# that a burst of parallel attempts can't all be verified before any of
+# them is counted. the number of attempts within the last
+# `LOGIN_THROTTLE_WINDOW` seconds is a sliding window.
+
+
+def create_phone_number_failures_key(phone_number: str) -> str:
+    return f"users:login_failures:phone_numbers:{phone_number}"
+
+
+def create_ip_address_failures_key(ip_address: str) -> str:
+    return f"users:login_failures:ip_addresses:{ip_address}"
+
+
+# KEYS: failures key
+# ARGV: now, attempt id, window, max failures
+# returns 1 if the attempt was recorded, or 0 if it is throttled
+RECORD_ATTEMPT_SCRIPT = """\
+local window_start = tonumber(ARGV[1]) - tonumber(ARGV[3])
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", window_start)
+if redis.call("ZCARD", KEYS[1]) >= tonumber(ARGV[4]) then
+    return 0
+end
+redis.call("ZADD", KEYS[1], ARGV[1], ARGV[2])
+redis.call("EXPIRE", KEYS[1], ARGV[3])
+return 1
+"""
+
+
+async def record_attempt(
+    ctx: Context,
+    phone_number: str,
+    ip_address: str | None,
+) -> str | None:
+    """\
+    Record a login attempt as a failure until it's known otherwise,
+    returning its id, or `None` if the phone number or ip address has
+    too many failures within the window to attempt another.
+
+    Attempts without an ip address are only throttled by phone number.
+    """
+    record_attempt = ctx.redis.register_script(RECORD_ATTEMPT_SCRIPT)
+    attempt_id = uuid.uuid4().hex
+
+    # the keys may be in different cluster slots, so each is its own call
+    now = time.time()
+    recorded_keys = []
+    buckets = [
+        (
+            create_phone_number_failures_key(phone_number),
+            settings.LOGIN_THROTTLE_MAX_PHONE_NUMBER_FAILURES,
+        ),
+    ]
+    if ip_address is not None:
+        buckets.insert(
+            0,
+            (
+                create_ip_address_failures_key(ip_address),
+                settings.LOGIN_THROTTLE_MAX_IP_ADDRESS_FAILURES,
+            ),
+        )
+
+    for key, max_failures in buckets:
+        recorded = await record_attempt(
+            keys=[key],
+            args=[now, attempt_id, settings.LOGIN_THROTTLE_WINDOW, max_failures],
+        )
+        if not recorded:
+            for recorded_key in recorded_keys:
+                await ctx.redis.zrem(recorded_key, attempt_id)
+            return None
+
+        recorded_keys.append(key)
+
+    return attempt_id
+
+
+async def forget_attempt(
+    ctx: Context,
+    phone_number: str,
+    ip_address: str | None,
+    attempt_id: str,
+) -> None:
+    """Forget an attempt which didn't fail, e.g. as it was malformed."""
+    if ip_address is not None:
+        await ctx.redis.zrem(create_ip_address_failures_key(ip_address), attempt_id)
+    await ctx.redis.zrem(create_phone_number_failures_key(phone_number), attempt_id)
+
+
+async def clear_phone_number_failures(ctx: Context, phone_number: str) -> None:
+    await ctx.redis.delete(create_phone_number_failures_key(phone_number))
@@ -1,24 +1,378 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import time
+from collections.abc import Mapping
 from datetime import datetime
 from datetime import timedelta
 from typing import Any
 from typing import Literal
 from uuid import UUID
 
+import redis.asyncio as aioredis
+from app.adapters.redis import ServiceRedis
 from app.common import json
 from app.common import logger
+from app.common import settings
+from app.common.cache import TTLCache
 from app.common.context import Context
+from prometheus_client import Counter
+from redis.exceptions import ResponseError
 
 SESSION_EXPIRY = 3600  # 1h
 
+# sessions are cached in-process for the gateway's auth checks. writes
+# invalidate the local cache directly, and other processes through pub/sub.
+SESSION_INVALIDATIONS_CHANNEL = "users:sessions:invalidations"
+
+session_cache: TTLCache[str, dict[str, Any]] = TTLCache(
+    max_size=settings.SESSION_CACHE_MAX_SIZE,
+)
+
+SESSION_CACHE_HITS = Counter(
+    "session_cache_hits_total",
+    "Session lookups served from the in-process cache",
+)
+SESSION_CACHE_MISSES = Counter(
+    "session_cache_misses_total",
+    "Session lookups which had to go to redis",
+)
+SESSION_CACHE_INVALIDATIONS = Counter(
+    "session_cache_invalidations_total",
+    "Session invalidations received from other processes",
+)
+
+
+# sessions deleted while signed session tokens may still be outstanding,
+# scored by the time after which any such token will have expired. each
+# process keeps a copy in memory, so tokens can be checked without redis.
+SESSION_REVOCATIONS_KEY = "users:session_revocations"
+
+revoked_session_ids: set[str] = set()
+
 
 def create_session_key(session_id: UUID | Literal["*"]) -> str:
     return f"users:sessions:{session_id}"
 
 
-# TODO: is my usage of setex correct?
-# i'm technically desyncing from the expires_at var
+def create_account_sessions_key(account_id: UUID | str) -> str:
+    if settings.REDIS_CLUSTER_MODE:
+        # hash-tagged, so that everything stored per-account shares a slot
+        return f"users:accounts:{{{account_id}}}:sessions"
+
+    return f"users:accounts:{account_id}:sessions"
+
+
+# in cluster mode, a script may only touch keys in the slot of the keys
+# it declares. sessions are looked up by id alone, so a session can't be
+# placed in its account's slot, and the account index is instead updated
+# by a separate call after the session itself has been written.
+def _account_sessions_key_format(ctx: Context) -> str:
+    if ctx.redis.cluster:
+        return ""
+
+    return create_account_sessions_key("%s")
+
+
+# sessions are stored as hashes in a compact, versioned encoding (see
+# `encode_session`), and every write is performed by a single server-side
+# script so that it costs one atomic round trip. sessions written by older
+# versions as json strings are still read, and are rewritten in the current
+# encoding the first time they're updated.
+
+SESSION_ENCODING_VERSION = 1
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _encode_datetime(value: str) -> int:
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return (dt - _EPOCH) // _MICROSECOND
+
+
+def _decode_datetime(value: bytes) -> str:
+    return (_EPOCH + int(value) * _MICROSECOND).isoformat()
+
+
+def encode_session(session: Mapping[str, Any]) -> dict[str, bytes | int]:
+    """\
+    Encode a session for storage as a redis hash.
+
+    The session id is not stored, as it is already part of the key.
+    UUIDs are packed into 16 bytes, and timestamps are stored as integer
+    microseconds since the epoch, which redis keeps as native integers.
+    """
+    return {
+        "v": SESSION_ENCODING_VERSION,
+        "a": UUID(session["account_id"]).bytes,
+        "e": _encode_datetime(session["expires_at"]),
+        "c": _encode_datetime(session["created_at"]),
+        "u": _encode_datetime(session["updated_at"]),
+    }
+
+
+def decode_session(
+    session_id: UUID | str,
+    raw_session: Mapping[bytes, bytes] | bytes,
+) -> dict[str, Any]:
+    if isinstance(raw_session, bytes):
+        # stored as a json string by an older version
+        return json.loads(raw_session)
+
+    return {
+        "session_id": str(session_id),
+        "account_id": str(UUID(bytes=raw_session[b"a"])),
+        "expires_at": _decode_datetime(raw_session[b"e"]),
+        "created_at": _decode_datetime(raw_session[b"c"]),
+        "updated_at": _decode_datetime(raw_session[b"u"]),
+    }
+
+
+def _decode_script_reply(
+    session_id: UUID | str,
+    raw_session: list[bytes] | bytes,
+) -> dict[str, Any]:
+    if isinstance(raw_session, list):
+        # flattened HGETALL reply
+        raw_session = dict(zip(raw_session[::2], raw_session[1::2]))
+
+    return decode_session(session_id, raw_session)
+
+
+# a per-account secondary index of session ids, scored by their expiry time.
+# expired members are pruned on every write, and the index itself expires
+# alongside the longest-lived session it references.
+_UPDATE_ACCOUNT_SESSIONS_FUNCTION = """\
+local function update_account_sessions(key, session_id, expires_at, now)
+    redis.call("ZADD", key, expires_at, session_id)
+    redis.call("ZREMRANGEBYSCORE", key, "-inf", now)
+    local latest = redis.call("ZRANGE", key, -1, -1, "WITHSCORES")
+    if latest[2] ~= nil then
+        redis.call("EXPIREAT", key, math.ceil(tonumber(latest[2])))
+    end
+end
+"""
+
+_FORMAT_UUID_FUNCTION = """\
+local function format_uuid(raw)
+    local hex = string.gsub(raw, ".", function(c)
+        return string.format("%02x", string.byte(c))
+    end)
+    return string.sub(hex, 1, 8) .. "-" .. string.sub(hex, 9, 12) .. "-"
+        .. string.sub(hex, 13, 16) .. "-" .. string.sub(hex, 17, 20) .. "-"
+        .. string.sub(hex, 21, 32)
+end
+"""
+
+UPDATE_ACCOUNT_SESSIONS_SCRIPT = (
+    _UPDATE_ACCOUNT_SESSIONS_FUNCTION
+    + """\
+update_account_sessions(KEYS[1], ARGV[1], ARGV[2], ARGV[3])
+"""
+)
+
+# KEYS: session key
+# ARGV: account sessions key format (empty to skip the index), session id,
+#       encoding version, updated at, now, invalidations channel,
+#       [expires at, expires at timestamp]
+# returns the updated session, which is deleted if its new expiry has
+# already passed, or 0 if the session is stored in an older encoding
+PARTIAL_UPDATE_SCRIPT = (
+    _UPDATE_ACCOUNT_SESSIONS_FUNCTION
+    + _FORMAT_UUID_FUNCTION
+    + """\
+local kind = redis.call("TYPE", KEYS[1]).ok
+if kind == "none" then
+    return false
+end
+
+if kind ~= "hash" or redis.call("HGET", KEYS[1], "v") ~= ARGV[3] then
+    return 0
+end
+
+redis.call("HSET", KEYS[1], "u", ARGV[4])
+if ARGV[7] ~= nil then
+    -- an explicitly set expiry is never slid past
+    redis.call("HSET", KEYS[1], "e", ARGV[7], "x", 1)
+end
+
+-- read before setting the expiry, which may remove the session
+local session = redis.call("HGETALL", KEYS[1])
+
+if ARGV[7] ~= nil then
+    local account_sessions_key
+    if ARGV[1] ~= "" then
+        local account_id = format_uuid(redis.call("HGET", KEYS[1], "a"))
+        account_sessions_key = string.format(ARGV[1], account_id)
+    end
+
+    if tonumber(ARGV[8]) <= tonumber(ARGV[5]) then
+        -- expired by the update itself
+        redis.call("DEL", KEYS[1])
+        if account_sessions_key ~= nil then
+            redis.call("ZREM", account_sessions_key, ARGV[2])
+        end
+    else
+        redis.call("EXPIREAT", KEYS[1], math.ceil(tonumber(ARGV[8])))
+        if account_sessions_key ~= nil then
+            update_account_sessions(account_sessions_key, ARGV[2], ARGV[8], ARGV[5])
+        end
+    end
+end
+
+redis.call("PUBLISH", ARGV[6], ARGV[2])
+
+return session
+"""
+)
+
+# KEYS: session key
+# ARGV: account sessions key format (empty to skip the index), session id,
+#       invalidations channel
+DELETE_SCRIPT = (
+    _FORMAT_UUID_FUNCTION
+    + """\
+local kind = redis.call("TYPE", KEYS[1]).ok
+if kind == "none" then
+    return false
+end
+
+local session
+local account_id
+if kind == "string" then
+    session = redis.call("GET", KEYS[1])
+    account_id = cjson.decode(session)["account_id"]
+else
+    session = redis.call("HGETALL", KEYS[1])
+    account_id = format_uuid(redis.call("HGET", KEYS[1], "a"))
+end
+
+redis.call("DEL", KEYS[1])
+if ARGV[1] ~= "" then
+    redis.call("ZREM", string.format(ARGV[1], account_id), ARGV[2])
+end
+redis.call("PUBLISH", ARGV[3], ARGV[2])
+
+return session
+"""
+)
+
+
+# KEYS: session key
+# ARGV: account sessions key format (empty to skip the index), session id,
+#       encoding version, expires at, expires at timestamp, now,
+#       invalidations channel
+# returns 0 if the session doesn't exist, has an explicitly set expiry, or
+# is stored in an older encoding
+EXTEND_SCRIPT = (
+    _UPDATE_ACCOUNT_SESSIONS_FUNCTION
+    + _FORMAT_UUID_FUNCTION
+    + """\
+if redis.call("TYPE", KEYS[1]).ok ~= "hash"
+    or redis.call("HGET", KEYS[1], "v") ~= ARGV[3]
+    or redis.call("HEXISTS", KEYS[1], "x") == 1 then
+    return 0
+end
+
+redis.call("HSET", KEYS[1], "e", ARGV[4])
+redis.call("EXPIREAT", KEYS[1], math.ceil(tonumber(ARGV[5])))
+
+if ARGV[1] ~= "" then
+    local account_id = format_uuid(redis.call("HGET", KEYS[1], "a"))
+    update_account_sessions(
+        string.format(ARGV[1], account_id), ARGV[2], ARGV[5], ARGV[6]
+    )
+end
+
+-- other processes would otherwise serve the old expiry from their caches,
+-- and each extend the session again
+redis.call("PUBLISH", ARGV[7], ARGV[2])
+
+return 1
+"""
+)
+
+
+def _is_wrong_type(exc: ResponseError) -> bool:
+    return str(exc).startswith("WRONGTYPE")
+
+
+async def _update_account_sessions(
+    ctx: Context,
+    account_id: UUID | str,
+    session_id: UUID | str,
+    expires_at: datetime,
+    now: datetime,
+    client: Any = None,
+) -> None:
+    update_account_sessions = ctx.redis.register_script(UPDATE_ACCOUNT_SESSIONS_SCRIPT)
+    await update_account_sessions(
+        keys=[create_account_sessions_key(account_id)],
+        args=[str(session_id), expires_at.timestamp(), now.timestamp()],
+        client=client,
+    )
+
+
+async def _store(
+    ctx: Context,
+    session: Mapping[str, Any],
+    now: datetime,
+    invalidate: bool = True,
+    explicit_expiry: bool = False,
+) -> None:
+    """\
+    Write a session in the current encoding.
+
+    A newly created session can't be cached by any process yet, so it is
+    stored with `invalidate=False`, sparing every process an invalidation.
+    A session whose expiry was set explicitly is stored with
+    `explicit_expiry=True`, and its expiry is never slid.
+    """
+    session_key = create_session_key(session["session_id"])
+    expires_at = datetime.fromisoformat(session["expires_at"])
+
+    mapping = encode_session(session)
+    if explicit_expiry:
+        mapping["x"] = 1
+
+    async with ctx.redis.pipeline(transaction=True) as pipe:
+        pipe.delete(session_key)
+        pipe.hset(session_key, mapping=mapping)
+        pipe.expireat(session_key, expires_at)
+        if not ctx.redis.cluster:
+            await _update_account_sessions(
+                ctx,
+                session["account_id"],
+                session["session_id"],
+                expires_at,
+                now,
+                client=pipe,
+            )
+            if invalidate:
+                pipe.publish(SESSION_INVALIDATIONS_CHANNEL, session["session_id"])
+        await pipe.execute()
+
+    if ctx.redis.cluster:
+        # the index lives in another slot, so can't join the transaction
+        await _update_account_sessions(
+            ctx,
+            session["account_id"],
+            session["session_id"],
+            expires_at,
+            now,
+        )
+        if invalidate:
+            await ctx.redis.publish(
+                SESSION_INVALIDATIONS_CHANNEL,
+                session["session_id"],
+            )
+
+    if invalidate:
+        session_cache.invalidate(session["session_id"])
 
 
 async def create(
@@ -35,62 +389,383 @@ async def create(
         "created_at": now.isoformat(),
         "updated_at": now.isoformat(),
     }
-    await ctx.redis.setex(
-        name=create_session_key(session_id),
-        time=SESSION_EXPIRY,
-        value=json.dumps(session),
-    )
+    await _store(ctx, session, now, invalidate=False)
     return session
 
 
 async def fetch_one(ctx: Context, session_id: UUID) -> dict[str, Any] | None:
-    session = await ctx.redis.get(create_session_key(session_id))
-    if session is None:
+    cache_key = str(session_id)
+
+    session = session_cache.get(cache_key)
+    if session is not None:
+        SESSION_CACHE_HITS.inc()
+        session = dict(session)
+    else:
+        SESSION_CACHE_MISSES.inc()
+
+        generation = session_cache.generation(cache_key)
+        session = await _fetch_one_uncached(ctx, session_id)
+        if session is None:
+            return None
+
+        # never serve a session from the cache past its expiry
+        expires_in = (
+            datetime.fromisoformat(session["expires_at"]).timestamp() - time.time()
+        )
+        session_cache.set(
+            cache_key,
+            dict(session),
+            ttl=min(settings.SESSION_CACHE_TTL, expires_in),
+            generation=generation,
+        )
+
+    if settings.SESSION_SLIDING_EXPIRY:
+        session = await _slide_expiry(ctx, session)
+
+    return session
+
+
+async def _slide_expiry(ctx: Context, session: dict[str, Any]) -> dict[str, Any]:
+    """\
+    Push back the expiry of a session which is in use.
+
+    To keep reads cheap, a session is only extended once the configured
+    fraction of its lifetime has passed, and the extension only touches
+    the session's expiry. Sessions whose expiry was set explicitly keep it.
+    """
+    now = datetime.now()
+    expires_at = datetime.fromisoformat(session["expires_at"])
+
+    threshold = SESSION_EXPIRY * (1 - settings.SESSION_SLIDING_EXPIRY_THRESHOLD)
+    if (expires_at - now).total_seconds() > threshold:
+        return session
+
+    new_expires_at = now + timedelta(seconds=SESSION_EXPIRY)
+
+    extend_session = ctx.redis.register_script(EXTEND_SCRIPT)
+    extended = await extend_session(
+        keys=[create_session_key(session["session_id"])],
+        args=[
+            _account_sessions_key_format(ctx),
+            session["session_id"],
+            SESSION_ENCODING_VERSION,
+            _encode_datetime(new_expires_at.isoformat()),
+            new_expires_at.timestamp(),
+            now.timestamp(),
+            SESSION_INVALIDATIONS_CHANNEL,
+        ],
+    )
+    if not extended:
+        # deleted, or stored in an older encoding which is upgraded on
+        # its next update
+        return session
+
+    if ctx.redis.cluster:
+        await _update_account_sessions(
+            ctx,
+            session["account_id"],
+            session["session_id"],
+            new_expires_at,
+            now,
+        )
+
+    session_cache.invalidate(session["session_id"])
+
+    session["expires_at"] = new_expires_at.isoformat()
+    return session
+
+
+async def _read_one(
+    client: ServiceRedis | aioredis.Redis,
+    session_key: str,
+) -> dict[bytes, bytes] | bytes | None:
+    try:
+        return await client.hgetall(session_key)
+    except ResponseError as exc:
+        if not _is_wrong_type(exc):
+            raise
+
+        return await client.get(session_key)
+
+
+async def _fetch_one_uncached(
+    ctx: Context,
+    session_id: UUID,
+) -> dict[str, Any] | None:
+    session_key = create_session_key(session_id)
+
+    raw_session = await _read_one(ctx.redis, session_key)
+
+    if not raw_session and ctx.redis.replicas:
+        # the session may have been created moments ago, and not have
+        # reached the replicas yet
+        raw_session = await _read_one(ctx.redis.primary, session_key)
+
+    if not raw_session:
         return None
-    return json.loads(session)
+
+    return decode_session(session_id, raw_session)
+
+
+async def listen_for_invalidations(redis: ServiceRedis) -> None:
+    """Evict sessions from the local cache as other processes update them."""
+    while True:
+        try:
+            async with redis.pubsub() as pubsub:
+                await pubsub.subscribe(SESSION_INVALIDATIONS_CHANNEL)
+
+                # anything published while we weren't subscribed was missed
+                session_cache.clear()
+
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+
+                    SESSION_CACHE_INVALIDATIONS.inc()
+                    session_cache.invalidate(message["data"].decode())
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.warning(
+                "Lost session invalidation subscription, retrying",
+                error=exc,
+            )
+            session_cache.clear()
+            await asyncio.sleep(1)
+
+
+# an upper bound on the number of SCAN calls made to fill a single page,
+# so that each page costs bounded work even over a sparse keyspace
+MAX_SCAN_CALLS_PER_PAGE = 10
+
+
+def _encode_cursor(*parts: int | float) -> str:
+    return base64.urlsafe_b64encode(json.dumps(parts)).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> list[Any]:
+    try:
+        parts = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("Malformed cursor") from None
+
+    if not isinstance(parts, list) or not all(
+        isinstance(part, (int, float)) for part in parts
+    ):
+        raise ValueError("Malformed cursor")
+
+    return parts
+
+
+def is_valid_cursor(cursor: str, account_id: UUID | None = None) -> bool:
+    try:
+        parts = _decode_cursor(cursor)
+    except ValueError:
+        return False
+
+    # account listings resume from an index score and the number of
+    # members at that score already returned, global listings resume from
+    # a node, a scan cursor on that node and an offset into that scan
+    # batch. cursors issued before ties in the index were tracked omit the
+    # number returned, and those issued before listings could span several
+    # nodes omit the node.
+    if account_id is not None:
+        return len(parts) in (1, 2)
+
+    return len(parts) in (2, 3)
 
 
 async def fetch_many(
     ctx: Context,
     account_id: UUID | None = None,
-    page: int = 1,
+    cursor: str | None = None,
     page_size: int = 50,
-) -> list[dict[str, Any]]:
+) -> tuple[list[dict[str, Any]], str | None]:
+    """\
+    Fetch a page of sessions, along with an opaque cursor for the next page.
+
+    The returned cursor is `None` once there are no more sessions to fetch.
+    """
+    if account_id is not None:
+        return await _fetch_many_by_account(ctx, account_id, cursor, page_size)
+
     session_key = create_session_key("*")
 
-    if page > 1:
-        cursor, keys = await ctx.redis.scan(
-            cursor=0,
-            match=session_key,
-            count=(page - 1) * page_size,
-        )
+    if cursor is not None:
+        parts = _decode_cursor(cursor)
+        node, scan_cursor, skip = parts if len(parts) == 3 else [0, *parts]
     else:
-        cursor = None
+        node, scan_cursor, skip = 0, 0, 0
 
-    sessions = []
-    while cursor != 0:
-        cursor, keys = await ctx.redis.scan(
-            cursor=cursor or 0,
+    # in cluster mode each primary holds a share of the keyspace, and
+    # they are scanned one after another
+    node_count = ctx.redis.scan_node_count()
+
+    sessions: list[dict[str, Any]] = []
+    for _ in range(MAX_SCAN_CALLS_PER_PAGE):
+        next_scan_cursor, keys = await ctx.redis.scan(
+            cursor=scan_cursor,
             match=session_key,
             count=page_size,
+            node=node,
         )
 
-        raw_sessions = await ctx.redis.mget(keys)
-        for raw_session in raw_sessions:
-            if raw_session is None:
-                logger.warning("Session not found in Redis")
-                continue
+        # redis does not guarantee the count of keys returned, so a page
+        # may end part way through a batch; the cursor records how much
+        # of that batch has already been returned
+        # https://redis.io/commands/scan/#the-count-option
+        keys = keys[skip:]
+        remaining = page_size - len(sessions)
+
+        if len(keys) > remaining:
+            sessions.extend(await _fetch_existing_by_keys(ctx, keys[:remaining]))
+            return sessions, _encode_cursor(node, scan_cursor, skip + remaining)
+
+        sessions.extend(await _fetch_existing_by_keys(ctx, keys))
+
+        scan_cursor, skip = next_scan_cursor, 0
+        if scan_cursor == 0:
+            node += 1
+            if node >= node_count:
+                return sessions, None
+
+        if len(sessions) == page_size:
+            break
+
+    return sessions, _encode_cursor(node, scan_cursor, 0)
+
+
+async def _fetch_many_by_keys(
+    ctx: Context,
+    keys: list[bytes],
+) -> list[dict[str, Any] | None]:
+    if not keys:
+        return []
+
+    async with ctx.redis.read_pipeline() as pipe:
+        for key in keys:
+            pipe.hgetall(key)
+        raw_sessions = await pipe.execute(raise_on_error=False)
+
+    legacy_keys = [
+        key
+        for key, raw_session in zip(keys, raw_sessions)
+        if isinstance(raw_session, ResponseError) and _is_wrong_type(raw_session)
+    ]
+    if legacy_keys:
+        legacy_sessions = dict(zip(legacy_keys, await ctx.redis.mget(legacy_keys)))
+        raw_sessions = [
+            (
+                legacy_sessions[key]
+                if isinstance(raw_session, ResponseError)
+                else raw_session
+            )
+            for key, raw_session in zip(keys, raw_sessions)
+        ]
+
+    sessions: list[dict[str, Any] | None] = []
+    for key, raw_session in zip(keys, raw_sessions):
+        if isinstance(raw_session, Exception):
+            raise raw_session
+
+        if not raw_session:
+            sessions.append(None)
+            continue
+
+        session_id = key.rsplit(b":", 1)[-1].decode()
+        sessions.append(decode_session(session_id, raw_session))
+
+    return sessions
+
+
+async def _fetch_existing_by_keys(
+    ctx: Context,
+    keys: list[bytes],
+) -> list[dict[str, Any]]:
+    sessions = []
+    for session in await _fetch_many_by_keys(ctx, keys):
+        if session is None:
+            logger.warning("Session not found in Redis")
+            continue
+
+        sessions.append(session)
+
+    return sessions
 
-            session = json.loads(raw_session)
 
-            if account_id is not None and session["account_id"] != str(account_id):
-                continue
+async def _fetch_many_by_account(
+    ctx: Context,
+    account_id: UUID,
+    cursor: str | None,
+    page_size: int,
+) -> tuple[list[dict[str, Any]], str | None]:
+    account_sessions_key = create_account_sessions_key(account_id)
+
+    # sessions may share an expiry, e.g. when set explicitly, so a page can
+    # end part way through the members at one score. members with equal
+    # scores are ordered by id, and the cursor records how many of those
+    # at its score have already been returned.
+    cursor_expires_at = None
+    skip = 0
+    if cursor is not None:
+        parts = _decode_cursor(cursor)
+        if len(parts) == 2:
+            cursor_expires_at, skip = parts
+            min_score = repr(cursor_expires_at)
+        else:
+            min_score = f"({parts[0]!r}"
+    else:
+        min_score = repr(datetime.now().timestamp())
+
+    # fetch one extra member to tell whether another page exists
+    index_entries = await ctx.redis.zrangebyscore(
+        account_sessions_key,
+        min=min_score,
+        max="+inf",
+        start=skip,
+        num=page_size + 1,
+        withscores=True,
+    )
+    has_more = len(index_entries) > page_size
+    index_entries = index_entries[:page_size]
+    if not index_entries:
+        return [], None
+
+    fetched_sessions = await _fetch_many_by_keys(
+        ctx,
+        [
+            create_session_key(session_id.decode()).encode()
+            for session_id, _ in index_entries
+        ],
+    )
 
-            sessions.append(session)
+    sessions = []
+    stale_session_ids = []
+    for (session_id, _), session in zip(index_entries, fetched_sessions):
+        if session is None:
+            # deleted or expired before the index was updated
+            stale_session_ids.append(session_id)
+            continue
+
+        sessions.append(session)
+
+    if stale_session_ids:
+        await ctx.redis.zrem(account_sessions_key, *stale_session_ids)
+
+    if not has_more:
+        return sessions, None
+
+    # stale members were removed from the index above, so aren't counted
+    _, last_expires_at = index_entries[-1]
+    returned_at_last_expires_at = sum(
+        1
+        for session_id, expires_at in index_entries
+        if expires_at == last_expires_at and session_id not in stale_session_ids
+    )
+    if last_expires_at == cursor_expires_at:
+        returned_at_last_expires_at += skip
 
-    # redis does not guarantee the count of keys returned
-    # https://redis.io/commands/scan/#the-count-option
-    return sessions[:page_size]
+    return sessions, _encode_cursor(last_expires_at, returned_at_last_expires_at)
 
 
 async def partial_update(
@@ -98,39 +773,181 @@ async def partial_update(
     session_id: UUID,
     **kwargs: Any,
 ) -> dict[str, Any] | None:
-    raw_session = await ctx.redis.get(create_session_key(session_id))
-    if raw_session is None:
-        return None
-
-    session = json.loads(raw_session)
-
     if not kwargs:
-        return session
+        return await fetch_one(ctx, session_id)
 
-    session = dict(session)
+    now = datetime.now()
+    args: list[Any] = [
+        _account_sessions_key_format(ctx),
+        str(session_id),
+        SESSION_ENCODING_VERSION,
+        _encode_datetime(now.isoformat()),
+        now.timestamp(),
+        SESSION_INVALIDATIONS_CHANNEL,
+    ]
 
     expires_at = kwargs.get("expires_at")
 
     if expires_at is not None:
-        session["expires_at"] = expires_at.isoformat()
+        args.extend(
+            [_encode_datetime(expires_at.isoformat()), expires_at.timestamp()],
+        )
 
-    session["updated_at"] = datetime.now().isoformat()
+    partial_update_session = ctx.redis.register_script(PARTIAL_UPDATE_SCRIPT)
+    raw_session = await partial_update_session(
+        keys=[create_session_key(session_id)],
+        args=args,
+    )
+    session_cache.invalidate(str(session_id))
 
-    await ctx.redis.set(create_session_key(session_id), json.dumps(session))
+    if raw_session is None:
+        return None
 
-    if expires_at is not None:
-        await ctx.redis.expireat(create_session_key(session_id), expires_at)
+    if raw_session == 0:
+        # stored in an older encoding; rewrite it in the current one.
+        # this is not atomic, but only happens once per session.
+        session = await _fetch_one_uncached(ctx, session_id)
+        if session is None:
+            return None
+
+        session["updated_at"] = now.isoformat()
+        if expires_at is not None:
+            session["expires_at"] = expires_at.isoformat()
+
+        await _store(ctx, session, now, explicit_expiry=expires_at is not None)
+        return session
+
+    session = _decode_script_reply(session_id, raw_session)
+
+    if expires_at is not None and ctx.redis.cluster:
+        if expires_at.timestamp() <= now.timestamp():
+            await ctx.redis.zrem(
+                create_account_sessions_key(session["account_id"]),
+                str(session_id),
+            )
+        else:
+            await _update_account_sessions(
+                ctx,
+                session["account_id"],
+                session_id,
+                expires_at,
+                now,
+            )
 
     return session
 
 
 async def delete(ctx: Context, session_id: UUID) -> dict[str, Any] | None:
-    session_key = create_session_key(session_id)
+    delete_session = ctx.redis.register_script(DELETE_SCRIPT)
+    raw_session = await delete_session(
+        keys=[create_session_key(session_id)],
+        args=[
+            _account_sessions_key_format(ctx),
+            str(session_id),
+            SESSION_INVALIDATIONS_CHANNEL,
+        ],
+    )
+    session_cache.invalidate(str(session_id))
 
-    session = await ctx.redis.get(session_key)
-    if session is None:
+    if raw_session is None:
         return None
 
-    await ctx.redis.delete(session_key)
+    session = _decode_script_reply(session_id, raw_session)
+
+    if ctx.redis.cluster:
+        await ctx.redis.zrem(
+            create_account_sessions_key(session["account_id"]),
+            str(session_id),
+        )
+
+    if settings.SESSION_TOKEN_SECRET:
+        async with ctx.redis.pipeline(transaction=False) as pipe:
+            _revoke_tokens(pipe, [str(session_id)])
+            await pipe.execute()
 
-    return json.loads(session)
+    return session
+
+
+# the number of sessions removed per round trip when deleting all of an
+# account's sessions, so that no single call blocks redis for long
+DELETE_MANY_BATCH_SIZE = 500
+
+
+async def delete_many(ctx: Context, account_id: UUID) -> int:
+    """\
+    Delete all of an account's sessions, returning the number deleted.
+
+    Sessions are found through the account's index and deleted in batches
+    of `DELETE_MANY_BATCH_SIZE`, one pipelined round trip per batch.
+    """
+    account_sessions_key = create_account_sessions_key(account_id)
+
+    deleted = 0
+    while True:
+        # read from the primary, as the batch is removed from it below
+        session_ids = await ctx.redis.primary.zrange(
+            account_sessions_key,
+            0,
+            DELETE_MANY_BATCH_SIZE - 1,
+        )
+        if not session_ids:
+            return deleted
+
+        async with ctx.redis.pipeline(transaction=False) as pipe:
+            for session_id in session_ids:
+                pipe.delete(create_session_key(session_id.decode()))
+            pipe.zrem(account_sessions_key, *session_ids)
+            for session_id in session_ids:
+                pipe.publish(SESSION_INVALIDATIONS_CHANNEL, session_id)
+            if settings.SESSION_TOKEN_SECRET:
+                _revoke_tokens(
+                    pipe,
+                    [session_id.decode() for session_id in session_ids],
+                )
+            results = await pipe.execute()
+
+        # expired sessions may linger in the index, but aren't counted
+        deleted += sum(results[: len(session_ids)])
+
+        for session_id in session_ids:
+            session_cache.invalidate(session_id.decode())
+
+
+def _revoke_tokens(pipe: Any, session_ids: list[str]) -> None:
+    now = time.time()
+
+    # any token issued for these sessions expires within SESSION_EXPIRY
+    pipe.zadd(
+        SESSION_REVOCATIONS_KEY,
+        {session_id: now + SESSION_EXPIRY for session_id in session_ids},
+    )
+    pipe.zremrangebyscore(SESSION_REVOCATIONS_KEY, "-inf", now)
+
+    revoked_session_ids.update(session_ids)
+
+
+def is_revoked(session_id: UUID | str) -> bool:
+    return str(session_id) in revoked_session_ids
+
+
+async def sync_revocations(redis: ServiceRedis) -> None:
+    """Periodically copy the set of revoked sessions into memory."""
+    while True:
+        try:
+            session_ids = await redis.zrangebyscore(
+                SESSION_REVOCATIONS_KEY,
+                min=time.time(),
+                max="+inf",
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            # keep checking against the last copy until redis is back
+            logger.warning("Unable to sync session revocations", error=exc)
+        else:
+            revoked_session_ids.clear()
+            revoked_session_ids.update(
+                session_id.decode() for session_id in session_ids
+            )
+
+        await asyncio.sleep(settings.SESSION_TOKEN_REVOCATION_SYNC_INTERVAL)
@@ -11,6 +11,7 @@ from app.common.context import Context
 from app.common.errors import ServiceError
 from app.repositories import accounts as accounts_repo
 from app.repositories import credentials as credentials_repo
+from app.repositories import sessions as sessions_repo
 
 
 async def create(
@@ -30,6 +31,13 @@ async def create(
     if await accounts_repo.fetch_one(ctx, phone_number=phone_number):
         return ServiceError.ACCOUNTS_PHONE_NUMBER_EXISTS
 
+    # hashed ahead of the transaction, so that its connection isn't held
+    # while waiting on the hashing pool
+    try:
+        hashed_password = await security.hash_password(password)
+    except security.HashingOverloadedError:
+        return ServiceError.PASSWORD_HASHING_OVERLOADED
+
     transaction = await ctx.db.transaction()
 
     try:
@@ -44,7 +52,6 @@ async def create(
         )
 
         credentials_id = uuid.uuid4()
-        hashed_password = security.hash_password(password)
 
         await credentials_repo.create(
             ctx,
@@ -143,4 +150,13 @@ async def delete(
     else:
         await transaction.commit()
 
+    # sessions live outside of the database's transaction, so are revoked
+    # once the account is gone; any left behind by a failure here will
+    # still expire on their own
+    try:
+        await sessions_repo.delete_many(ctx, account_id)
+    except Exception as exc:  # pragma: no cover
+        logger.error("Unable to delete account sessions:", error=exc)
+        logger.error("Stack trace: ", error=traceback.format_exc())
+
     return account
@@ -1,52 +1,135 @@
+import asyncio
 import uuid
 from datetime import datetime
 from typing import Any
 from uuid import UUID
 
 from app.common import formatters
+from app.common import logger
 from app.common import security
+from app.common import settings
 from app.common import validators
 from app.common.context import Context
 from app.common.errors import ServiceError
 from app.repositories import credentials as credentials_repo
 from app.repositories import login_attempts as login_attempts_repo
+from app.repositories import login_throttles as login_throttles_repo
 from app.repositories import sessions as sessions_repo
 
 
+# references to in-flight rehashes, which would otherwise be collectable
+_rehash_tasks: set[asyncio.Task[None]] = set()
+
+
+async def _rehash_password(
+    ctx: Context,
+    credentials: dict[str, Any],
+    password: str,
+) -> None:
+    try:
+        hashed_password = await security.hash_password(password)
+        await credentials_repo.replace_secret(
+            ctx,
+            credentials["credentials_id"],
+            old_secret=credentials["secret"],
+            new_secret=hashed_password,
+        )
+    except Exception as exc:
+        # the hash will be upgraded on a later login instead
+        logger.warning(
+            "Unable to rehash password",
+            credentials_id=credentials["credentials_id"],
+            error=exc,
+        )
+
+
 async def create(
     ctx: Context,
     phone_number: str,
     password: str,
-    ip_address: str,
+    ip_address: str | None,
     user_agent: str,
 ) -> dict[str, Any] | ServiceError:
+    # failures are counted against the number as it would be stored
+    if validators.validate_phone_number(phone_number):
+        throttle_phone_number = formatters.phone_number(phone_number)
+    else:
+        throttle_phone_number = phone_number
+
+    # throttled attempts are recorded too, so brute-forcing stays visible
     login_attempt_id = uuid.uuid4()
-    await login_attempts_repo.create(
+    await login_attempts_repo.record(
         ctx,
         login_attempt_id,
         phone_number,
-        ip_address,
+        ip_address or "",
         user_agent,
     )
 
+    attempt_id = await login_throttles_repo.record_attempt(
+        ctx,
+        throttle_phone_number,
+        ip_address,
+    )
+    if attempt_id is None:
+        return ServiceError.SESSIONS_LOGIN_THROTTLED
+
+    # the attempt counts as a failure unless it is malformed, or succeeds
     if not validators.validate_phone_number(phone_number):
+        await login_throttles_repo.forget_attempt(
+            ctx,
+            throttle_phone_number,
+            ip_address,
+            attempt_id,
+        )
         return ServiceError.SESSIONS_PHONE_NUMBER_INVALID
 
     phone_number = formatters.phone_number(phone_number)
 
     if not validators.validate_password(password):
+        await login_throttles_repo.forget_attempt(
+            ctx,
+            phone_number,
+            ip_address,
+            attempt_id,
+        )
         return ServiceError.SESSIONS_PASSWORD_INVALID
 
     credentials = await credentials_repo.fetch_one(ctx, identifier=phone_number)
     if credentials is None:
         return ServiceError.CREDENTIALS_NOT_FOUND
 
-    if not security.verify_password(
-        hashed_password=credentials["secret"],
-        password=password,
-    ):
+    try:
+        password_correct = await security.verify_password(
+            hashed_password=credentials["secret"],
+            password=password,
+        )
+    except security.HashingOverloadedError:
+        await login_throttles_repo.forget_attempt(
+            ctx,
+            phone_number,
+            ip_address,
+            attempt_id,
+        )
+        return ServiceError.PASSWORD_HASHING_OVERLOADED
+
+    if not password_correct:
         return ServiceError.CREDENTIALS_INCORRECT
 
+    await login_throttles_repo.forget_attempt(
+        ctx,
+        phone_number,
+        ip_address,
+        attempt_id,
+    )
+    await login_throttles_repo.clear_phone_number_failures(ctx, phone_number)
+
+    if security.password_needs_rehash(credentials["secret"]):
+        # upgraded in the background, so the login isn't kept waiting
+        task = asyncio.create_task(_rehash_password(ctx, credentials, password))
+        _rehash_tasks.add(task)
+        task.add_done_callback(_rehash_tasks.discard)
+
     session_id = uuid.uuid4()
 
     session = await sessions_repo.create(
@@ -58,6 +141,38 @@ async def create(
     return session
 
 
+def create_token(session: dict[str, Any]) -> str | None:
+    if not settings.SESSION_TOKEN_SECRET:
+        return None
+
+    return security.create_session_token(
+        settings.SESSION_TOKEN_SECRET,
+        session_id=UUID(session["session_id"]),
+        account_id=UUID(session["account_id"]),
+        expires_at=datetime.fromisoformat(session["expires_at"]),
+    )
+
+
+def verify_token(token: str) -> dict[str, Any] | ServiceError:
+    """\
+    Verify a session token locally, without a round trip to redis.
+
+    Revocations made by other processes are seen once they've been synced,
+    which may take up to `SESSION_TOKEN_REVOCATION_SYNC_INTERVAL` seconds.
+    """
+    if not settings.SESSION_TOKEN_SECRET:
+        return ServiceError.SESSIONS_TOKEN_INVALID
+
+    claims = security.verify_session_token(settings.SESSION_TOKEN_SECRET, token)
+    if claims is None:
+        return ServiceError.SESSIONS_TOKEN_INVALID
+
+    if sessions_repo.is_revoked(claims["session_id"]):
+        return ServiceError.SESSIONS_TOKEN_REVOKED
+
+    return claims
+
+
 async def fetch_one(
     ctx: Context,
     session_id: UUID,
@@ -73,11 +188,19 @@ async def fetch_one(
 async def fetch_many(
     ctx: Context,
     account_id: UUID | None = None,
-    page: int = 1,
+    cursor: str | None = None,
     page_size: int = 50,
-) -> list[dict[str, Any]]:
-    sessions = await sessions_repo.fetch_many(ctx, account_id, page, page_size)
-    return sessions
+) -> tuple[list[dict[str, Any]], str | None] | ServiceError:
+    if cursor is not None and not sessions_repo.is_valid_cursor(cursor, account_id):
+        return ServiceError.SESSIONS_CURSOR_INVALID
+
+    sessions, next_cursor = await sessions_repo.fetch_many(
+        ctx,
+        account_id,
+        cursor,
+        page_size,
+    )
+    return sessions, next_cursor
 
 
 async def partial_update(
@@ -107,3 +230,8 @@ async def delete(
         return ServiceError.SESSIONS_NOT_FOUND
 
     return session
+
+
+async def delete_many(ctx: Context, account_id: UUID) -> int:
+    deleted = await sessions_repo.delete_many(ctx, account_id)
+    return deleted
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""\
+Compare the per-query overhead of the `databases` backend against the
+asyncpg backend, by running the same queries through a `ServiceDatabase`
+built on each, against the configured write database.
+
+Usage: python benchmarks/database_backends.py [iterations]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.adapters.database import ServiceDatabase
+from app.adapters.database import dsn
+from app.common import settings
+
+BACKENDS = ("databases", "asyncpg")
+
+# `:name` parameters are parsed by both backends, and the results of each
+# converted to dicts - this is the work the asyncpg backend aims to avoid
+QUERIES = {
+    "fetch_one": (
+        "SELECT CAST(:id AS int) AS id, CAST(:name AS text) AS name",
+        {"id": 1, "name": "benchmark"},
+    ),
+    "fetch_all": (
+        "SELECT oid, typname FROM pg_type ORDER BY oid LIMIT :limit",
+        {"limit": 50},
+    ),
+    "fetch_val": (
+        "SELECT CAST(:value AS int)",
+        {"value": 1},
+    ),
+}
+
+
+def _create_db(backend: str) -> ServiceDatabase:
+    write_dsn = dsn(
+        scheme=settings.WRITE_DB_SCHEME,
+        user=settings.WRITE_DB_USER,
+        password=settings.WRITE_DB_PASS,
+        host=settings.WRITE_DB_HOST,
+        port=settings.WRITE_DB_PORT,
+        database=settings.WRITE_DB_NAME,
+    )
+    return ServiceDatabase(
+        read_dsns=[],
+        write_dsn=write_dsn,
+        min_pool_size=1,
+        max_pool_size=1,
+        ssl=False,
+        backend=backend,
+    )
+
+
+async def _time_query(
+    db: ServiceDatabase,
+    method: str,
+    query: str,
+    values: dict,
+    iterations: int,
+) -> list[float]:
+    # warm the pool, and any statement caches
+    for _ in range(min(iterations, 100)):
+        await getattr(db, method)(query, values)
+
+    timings = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        await getattr(db, method)(query, values)
+        timings.append(time.perf_counter() - started_at)
+
+    return timings
+
+
+async def _run(iterations: int) -> int:
+    results: dict[tuple[str, str], list[float]] = {}
+    for backend in BACKENDS:
+        async with _create_db(backend) as db:
+            for method, (query, values) in QUERIES.items():
+                results[(backend, method)] = await _time_query(
+                    db,
+                    method,
+                    query,
+                    values,
+                    iterations,
+                )
+
+    print(
+        f"{'backend':<12}{'query':<12}{'mean (us)':>12}{'p50 (us)':>12}{'p99 (us)':>12}"
+    )
+    for (backend, method), timings in results.items():
+        percentiles = statistics.quantiles(timings, n=100)
+        print(
+            f"{backend:<12}{method:<12}"
+            f"{statistics.fmean(timings) * 1e6:>12.1f}"
+            f"{percentiles[49] * 1e6:>12.1f}"
+            f"{percentiles[98] * 1e6:>12.1f}",
+        )
+
+    # the round trip to postgres is common to both backends, so the
+    # difference between them is the overhead saved per query
+    print()
+    for method in QUERIES:
+        saved = statistics.fmean(results[("databases", method)]) - statistics.fmean(
+            results[("asyncpg", method)],
+        )
+        print(f"{method}: asyncpg saves {saved * 1e6:.1f}us per query")
+
+    return 0
+
+
+def main() -> int:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    return asyncio.run(_run(iterations))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""\
+Measure the latency and memory of argon2 password hashing on this host,
+across a range of parameters, to choose `PASSWORD_HASH_TIME_COST`,
+`PASSWORD_HASH_MEMORY_COST` and `PASSWORD_HASH_PARALLELISM`.
+
+Each parameter set is measured in a fresh process, so that the peak
+memory of one doesn't hide that of the next.
+
+Usage: python benchmarks/password_hashing.py [--iterations N]
+           [--time-cost T ...] [--memory-cost KiB ...] [--parallelism P ...]
+"""
+import argparse
+import itertools
+import multiprocessing
+import resource
+import statistics
+import time
+
+import argon2
+
+
+def _measure(
+    time_cost: int,
+    memory_cost: int,
+    parallelism: int,
+    iterations: int,
+) -> tuple[float, float, float]:
+    ph = argon2.PasswordHasher(
+        time_cost=time_cost,
+        memory_cost=memory_cost,
+        parallelism=parallelism,
+    )
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB
+
+    timings = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        hashed_password = ph.hash("correct horse battery staple")
+        timings.append(time.perf_counter() - start_time)
+
+    # logins verify far more often than they hash; the cost is the same
+    ph.verify(hashed_password, "correct horse battery staple")
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (
+        statistics.median(timings),
+        max(timings),
+        (peak_rss - baseline_rss) / 1024,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--time-cost", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument(
+        "--memory-cost",
+        type=int,
+        nargs="+",
+        default=[19456, 47104, 65536, 131072],
+    )
+    parser.add_argument("--parallelism", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    print(
+        f"{'time':>6}{'memory (KiB)':>14}{'parallel':>10}"
+        f"{'p50 (ms)':>11}{'max (ms)':>11}{'peak rss (MiB)':>16}",
+    )
+
+    with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        for time_cost, memory_cost, parallelism in itertools.product(
+            args.time_cost,
+            args.memory_cost,
+            args.parallelism,
+        ):
+            median, maximum, peak_rss = pool.apply(
+                _measure,
+                (time_cost, memory_cost, parallelism, args.iterations),
+            )
+            print(
+                f"{time_cost:>6}{memory_cost:>14}{parallelism:>10}"
+                f"{median * 1000:>11.1f}{maximum * 1000:>11.1f}{peak_rss:>16.1f}",
+            )
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""\
+Compare the memory and speed of the compact session encoding against the
+json encoding sessions were previously stored with.
+
+Memory is measured with `MEMORY USAGE` on sessions written under their
+real keys to the configured redis, so it includes the key, the value's
+internal encoding and redis' per-key overhead. The sessions written are
+deleted afterwards.
+
+Usage: python benchmarks/session_encoding.py [--iterations N] [--sessions N]
+"""
+import argparse
+import os
+import statistics
+import sys
+import timeit
+import uuid
+from collections.abc import Callable
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+
+import redis
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.common import json
+from app.common import settings
+from app.repositories import sessions as sessions_repo
+
+
+def _sample_session() -> dict[str, str]:
+    now = datetime.now()
+    return {
+        "session_id": str(uuid.uuid4()),
+        "account_id": str(uuid.uuid4()),
+        "expires_at": (
+            now + timedelta(seconds=sessions_repo.SESSION_EXPIRY)
+        ).isoformat(),
+        "created_at": now.isoformat(),
+        "updated_at": now.isoformat(),
+    }
+
+
+def _store_json(pipe: Any, key: str, session: dict[str, str]) -> None:
+    pipe.set(key, json.dumps(session))
+
+
+def _store_compact(pipe: Any, key: str, session: dict[str, str]) -> None:
+    pipe.hset(key, mapping=sessions_repo.encode_session(session))
+
+
+def _measure_memory(
+    client: redis.Redis,
+    store: Callable[[Any, str, dict[str, str]], None],
+    sessions: int,
+) -> tuple[float, str]:
+    keys = []
+    with client.pipeline(transaction=False) as pipe:
+        for _ in range(sessions):
+            session = _sample_session()
+            key = sessions_repo.create_session_key(session["session_id"])
+            store(pipe, key, session)
+            pipe.expire(key, sessions_repo.SESSION_EXPIRY)
+            keys.append(key)
+        pipe.execute()
+
+    try:
+        with client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                # SAMPLES 0 measures every field, rather than estimating
+                pipe.memory_usage(key, samples=0)
+            usages = pipe.execute()
+
+        return statistics.mean(usages), client.object("encoding", keys[0]).decode()
+    finally:
+        client.delete(*keys)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100_000)
+    parser.add_argument("--sessions", type=int, default=1000)
+    args = parser.parse_args()
+
+    client = redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+    )
+
+    session = _sample_session()
+    session_id = session["session_id"]
+
+    json_value = json.dumps(session)
+    compact_value = sessions_repo.encode_session(session)
+    # the shape redis hands back from HGETALL
+    compact_reply = {
+        field.encode(): value if isinstance(value, bytes) else str(value).encode()
+        for field, value in compact_value.items()
+    }
+    assert sessions_repo.decode_session(session_id, compact_reply) == session
+
+    results = {
+        "json": (
+            _measure_memory(client, _store_json, args.sessions),
+            timeit.timeit(lambda: json.dumps(session), number=args.iterations),
+            timeit.timeit(lambda: json.loads(json_value), number=args.iterations),
+        ),
+        "compact": (
+            _measure_memory(client, _store_compact, args.sessions),
+            timeit.timeit(
+                lambda: sessions_repo.encode_session(session),
+                number=args.iterations,
+            ),
+            timeit.timeit(
+                lambda: sessions_repo.decode_session(session_id, compact_reply),
+                number=args.iterations,
+            ),
+        ),
+    }
+
+    print(
+        f"{'encoding':<10}{'redis encoding':>16}{'bytes/key':>11}"
+        f"{'encode (us)':>14}{'decode (us)':>14}",
+    )
+    for name, ((memory, object_encoding), encode_time, decode_time) in results.items():
+        print(
+            f"{name:<10}{object_encoding:>16}{memory:>11.1f}"
+            f"{encode_time / args.iterations * 1e6:>14.2f}"
+            f"{decode_time / args.iterations * 1e6:>14.2f}",
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
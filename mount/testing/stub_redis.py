@@ -0,0 +1,113 @@
+import fnmatch
+from typing import Any
+
+from redis.asyncio.cluster import RedisCluster
+from redis.cluster import key_slot
+from redis.connection import Encoder
+
+SLOT_COUNT = 16384
+
+
+class StubClusterNode:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.data: dict[bytes, Any] = {}
+
+
+class StubRedisCluster(RedisCluster):
+    """\
+    An in-memory stand-in for a redis cluster, with the slots divided evenly
+    between `node_count` primaries.
+
+    Keys are routed to nodes by their real hash slots, and multi-key reads
+    use `RedisCluster`'s own splitting by slot; only the calls made to the
+    nodes themselves are stubbed.
+    """
+
+    def __init__(self, node_count: int) -> None:
+        # the real client connects to the cluster on construction
+        self.encoder = Encoder("utf-8", "strict", False)
+        self.nodes = [
+            StubClusterNode(f"node-{index}:6379") for index in range(node_count)
+        ]
+
+    def node_for(self, key: str | bytes) -> StubClusterNode:
+        slot = key_slot(self.encoder.encode(key))
+        return self.nodes[slot * len(self.nodes) // SLOT_COUNT]
+
+    def get_primaries(self) -> list[StubClusterNode]:
+        return list(self.nodes)
+
+    async def initialize(self) -> "StubRedisCluster":
+        return self
+
+    async def aclose(self) -> None:
+        pass
+
+    async def set(self, key: str, value: bytes) -> None:
+        self.node_for(key).data[self.encoder.encode(key)] = value
+
+    async def hset(self, key: str, mapping: dict[str, Any]) -> None:
+        self.node_for(key).data[self.encoder.encode(key)] = {
+            self.encoder.encode(field): self.encoder.encode(value)
+            for field, value in mapping.items()
+        }
+
+    async def scan(
+        self,
+        cursor: int = 0,
+        match: str | None = None,
+        count: int | None = None,
+        target_nodes: Any = None,
+    ) -> tuple[dict[str, int], list[bytes]]:
+        node = target_nodes
+        keys = sorted(
+            key
+            for key in node.data
+            if match is None or fnmatch.fnmatchcase(key.decode(), match)
+        )
+
+        # the cursor is simply an offset into the node's sorted keys
+        batch = keys[cursor : cursor + (count or 10)]
+        next_cursor = cursor + len(batch)
+        if next_cursor >= len(keys):
+            next_cursor = 0
+
+        return {node.name: next_cursor}, batch
+
+    async def _execute_pipeline_by_slot(
+        self,
+        command: str,
+        slots_to_args: dict[int, list[Any]],
+    ) -> list[Any]:
+        assert command == "MGET"
+
+        results = []
+        for slot, keys in slots_to_args.items():
+            node = self.nodes[slot * len(self.nodes) // SLOT_COUNT]
+            results.append([node.data.get(self.encoder.encode(key)) for key in keys])
+        return results
+
+    def pipeline(self, *args: Any, **kwargs: Any) -> "StubClusterPipeline":
+        return StubClusterPipeline(self)
+
+
+class StubClusterPipeline:
+    def __init__(self, cluster: StubRedisCluster) -> None:
+        self.cluster = cluster
+        self.keys: list[str | bytes] = []
+
+    async def __aenter__(self) -> "StubClusterPipeline":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    def hgetall(self, key: str | bytes) -> None:
+        self.keys.append(key)
+
+    async def execute(self, raise_on_error: bool = True) -> list[Any]:
+        return [
+            self.cluster.node_for(key).data.get(self.cluster.encoder.encode(key), {})
+            for key in self.keys
+        ]
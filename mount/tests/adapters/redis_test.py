@@ -0,0 +1,184 @@
+from typing import Any
+
+import pytest
+from app.adapters.redis import ServiceRedis
+from redis.exceptions import ConnectionError
+from testing.stub_redis import StubRedisCluster
+
+
+class StubRedis:
+    """Just enough of a redis client to tell which node served a command."""
+
+    def __init__(self, data: dict[str, bytes], master_link_status: str = "up"):
+        self.data = data
+        self.master_link_status = master_link_status
+        self.down = False
+        self.reads = 0
+
+    def _serve(self) -> None:
+        if self.down:
+            raise ConnectionError("Connection refused")
+        self.reads += 1
+
+    async def get(self, key: str) -> bytes | None:
+        self._serve()
+        return self.data.get(key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        self.data[key] = value
+
+    async def info(self, section: str) -> dict[str, Any]:
+        if self.down:
+            raise ConnectionError("Connection refused")
+        return {"role": "slave", "master_link_status": self.master_link_status}
+
+    def pipeline(self, transaction: bool = True) -> "StubPipeline":
+        return StubPipeline(self)
+
+
+class StubPipeline:
+    def __init__(self, client: StubRedis) -> None:
+        self.client = client
+        self.keys: list[str] = []
+
+    async def __aenter__(self) -> "StubPipeline":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    def get(self, key: str) -> None:
+        self.keys.append(key)
+
+    async def execute(self, raise_on_error: bool = True) -> list[Any]:
+        self.client._serve()
+        return [self.client.data.get(key) for key in self.keys]
+
+
+@pytest.fixture
+def primary() -> StubRedis:
+    return StubRedis({"key": b"primary"})
+
+
+@pytest.fixture
+def replica() -> StubRedis:
+    return StubRedis({"key": b"replica"})
+
+
+async def test_should_read_from_replica(primary: StubRedis, replica: StubRedis):
+    redis = ServiceRedis(primary=primary, replicas=[replica])
+
+    assert await redis.get("key") == b"replica"
+
+
+async def test_should_write_to_primary(primary: StubRedis, replica: StubRedis):
+    redis = ServiceRedis(primary=primary, replicas=[replica])
+
+    await redis.set("other", b"value")
+    assert primary.data["other"] == b"value"
+    assert "other" not in replica.data
+
+
+async def test_should_fail_over_to_primary_and_eject_replica(
+    primary: StubRedis,
+    replica: StubRedis,
+):
+    redis = ServiceRedis(primary=primary, replicas=[replica])
+    replica.down = True
+
+    assert await redis.get("key") == b"primary"
+
+    # the replica is no longer tried, even once it's back
+    replica.down = False
+    assert await redis.get("key") == b"primary"
+    assert replica.reads == 0
+
+
+async def test_should_readmit_replica_once_linked_to_primary(
+    primary: StubRedis,
+    replica: StubRedis,
+):
+    redis = ServiceRedis(primary=primary, replicas=[replica])
+    replica.master_link_status = "down"
+
+    await redis.check_replicas()
+    assert await redis.get("key") == b"primary"
+
+    replica.master_link_status = "up"
+    await redis.check_replicas()
+    assert await redis.get("key") == b"replica"
+
+
+async def test_should_not_admit_unreachable_replica(
+    primary: StubRedis,
+    replica: StubRedis,
+):
+    redis = ServiceRedis(primary=primary, replicas=[replica])
+    replica.down = True
+
+    await redis.check_replicas()
+
+    # not used again until the next health check finds it reachable
+    replica.down = False
+    assert await redis.get("key") == b"primary"
+    assert replica.reads == 0
+
+
+async def test_should_replay_read_pipeline_on_primary(
+    primary: StubRedis,
+    replica: StubRedis,
+):
+    redis = ServiceRedis(primary=primary, replicas=[replica])
+
+    async with redis.read_pipeline() as pipe:
+        pipe.get("key")
+        assert await pipe.execute() == [b"replica"]
+
+    replica.down = True
+    async with redis.read_pipeline() as pipe:
+        pipe.get("key")
+        assert await pipe.execute() == [b"primary"]
+
+
+def test_should_reject_write_in_read_pipeline(primary: StubRedis):
+    redis = ServiceRedis(primary=primary)
+
+    with pytest.raises(AttributeError):
+        redis.read_pipeline().set("key", b"value")
+
+
+async def test_should_mget_across_cluster_slots():
+    cluster = StubRedisCluster(node_count=3)
+    keys = [f"key-{index}" for index in range(20)]
+    for key in keys:
+        await cluster.set(key, key.encode())
+    assert len({cluster.node_for(key).name for key in keys}) == 3
+
+    redis = ServiceRedis(primary=cluster)
+    assert await redis.mget([*reversed(keys), "missing"]) == [
+        *(key.encode() for key in reversed(keys)),
+        None,
+    ]
+
+
+async def test_should_scan_each_cluster_node():
+    cluster = StubRedisCluster(node_count=3)
+    for index in range(20):
+        await cluster.set(f"key-{index}", b"value")
+
+    redis = ServiceRedis(primary=cluster)
+    assert redis.scan_node_count() == 3
+
+    scanned_keys = []
+    for node in range(redis.scan_node_count()):
+        cursor = None
+        while cursor != 0:
+            cursor, keys = await redis.scan(cursor=cursor or 0, count=2, node=node)
+            assert {cluster.node_for(key).name for key in keys} <= {
+                cluster.nodes[node].name,
+            }
+            scanned_keys.extend(keys)
+
+    assert sorted(scanned_keys) == sorted(
+        f"key-{index}".encode() for index in range(20)
+    )
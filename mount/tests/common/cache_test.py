@@ -0,0 +1,73 @@
+import pytest
+from app.common import cache
+from app.common.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_should_get_cached_value():
+    ttl_cache: TTLCache[str, int] = TTLCache(max_size=10)
+    ttl_cache.set("a", 1, ttl=60)
+
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("b") is None
+
+
+def test_should_expire_value_after_ttl(clock: list[float]):
+    ttl_cache: TTLCache[str, int] = TTLCache(max_size=10)
+    ttl_cache.set("a", 1, ttl=60)
+
+    clock[0] += 59
+    assert ttl_cache.get("a") == 1
+
+    clock[0] += 1
+    assert ttl_cache.get("a") is None
+    assert len(ttl_cache) == 0
+
+
+def test_should_evict_least_recently_used_value():
+    ttl_cache: TTLCache[str, int] = TTLCache(max_size=2)
+    ttl_cache.set("a", 1, ttl=60)
+    ttl_cache.set("b", 2, ttl=60)
+
+    assert ttl_cache.get("a") == 1  # "b" is now the least recently used
+    ttl_cache.set("c", 3, ttl=60)
+
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("b") is None
+    assert ttl_cache.get("c") == 3
+
+
+def test_should_not_cache_value_fetched_during_invalidation():
+    ttl_cache: TTLCache[str, int] = TTLCache(max_size=10)
+
+    generation = ttl_cache.generation("a")
+    ttl_cache.invalidate("a")  # while "a" was being fetched
+    ttl_cache.set("a", 1, ttl=60, generation=generation)
+
+    assert ttl_cache.get("a") is None
+
+
+def test_should_cache_value_fetched_during_invalidation_of_other_key():
+    ttl_cache: TTLCache[int, int] = TTLCache(max_size=10)
+
+    generation = ttl_cache.generation(1)
+    ttl_cache.invalidate(2)
+    ttl_cache.set(1, 1, ttl=60, generation=generation)
+
+    assert ttl_cache.get(1) == 1
+
+
+def test_should_not_cache_value_fetched_during_clear():
+    ttl_cache: TTLCache[str, int] = TTLCache(max_size=10)
+
+    generation = ttl_cache.generation("a")
+    ttl_cache.clear()
+    ttl_cache.set("a", 1, ttl=60, generation=generation)
+
+    assert ttl_cache.get("a") is None
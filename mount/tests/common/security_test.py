@@ -0,0 +1,157 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from datetime import timedelta
+
+import argon2
+import pytest
+from app.common import security
+
+SECRET = b"secret"
+
+
+def test_verify_session_token():
+    session_id = uuid.uuid4()
+    account_id = uuid.uuid4()
+    expires_at = datetime.now() + timedelta(hours=1)
+
+    token = security.create_session_token(SECRET, session_id, account_id, expires_at)
+
+    claims = security.verify_session_token(SECRET, token)
+    assert claims == {
+        "session_id": str(session_id),
+        "account_id": str(account_id),
+        "expires_at": expires_at.isoformat(),
+    }
+
+
+def test_verify_session_token_with_wrong_secret():
+    token = security.create_session_token(
+        SECRET,
+        uuid.uuid4(),
+        uuid.uuid4(),
+        datetime.now() + timedelta(hours=1),
+    )
+
+    assert security.verify_session_token(b"other secret", token) is None
+
+
+def test_verify_tampered_session_token():
+    token = security.create_session_token(
+        SECRET,
+        uuid.uuid4(),
+        uuid.uuid4(),
+        datetime.now() + timedelta(hours=1),
+    )
+    tampered_token = token[:4] + ("A" if token[4] != "A" else "B") + token[5:]
+
+    assert security.verify_session_token(SECRET, tampered_token) is None
+    assert security.verify_session_token(SECRET, token[:-1]) is None
+    assert security.verify_session_token(SECRET, "not a token") is None
+
+
+def test_verify_expired_session_token():
+    token = security.create_session_token(
+        SECRET,
+        uuid.uuid4(),
+        uuid.uuid4(),
+        datetime.now() - timedelta(seconds=1),
+    )
+
+    assert security.verify_session_token(SECRET, token) is None
+
+
+async def test_should_hash_and_verify_password():
+    hashed_password = await security.hash_password("password")
+
+    assert await security.verify_password(hashed_password, "password")
+    assert not await security.verify_password(hashed_password, "wrong password")
+
+
+async def test_should_reject_hashing_when_queue_is_full():
+    scheduler = security.HashingScheduler(max_concurrency=1, max_queue_size=1)
+    running = scheduler.run(time.sleep, 0.1)
+    queued = scheduler.run(time.sleep, 0)
+    tasks = [asyncio.create_task(running), asyncio.create_task(queued)]
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(security.HashingOverloadedError):
+        await scheduler.run(time.sleep, 0)
+
+    await asyncio.gather(*tasks)
+    assert scheduler.waiting == 0
+    await scheduler.run(time.sleep, 0)
+    scheduler.shutdown()
+
+
+async def test_should_reserve_memory_of_each_hash():
+    scheduler = security.HashingScheduler(
+        max_concurrency=4,
+        max_queue_size=4,
+        memory_budget=100,
+    )
+    tasks = [
+        asyncio.create_task(scheduler.run(time.sleep, 0.05, memory_cost=60)),
+        asyncio.create_task(scheduler.run(time.sleep, 0.05, memory_cost=60)),
+    ]
+    await asyncio.sleep(0.01)
+
+    # only one fits within the budget, despite the free thread
+    assert (scheduler.running, scheduler.waiting) == (1, 1)
+    assert scheduler.memory_in_use == 60
+
+    await asyncio.gather(*tasks)
+    assert (scheduler.running, scheduler.memory_in_use) == (0, 0)
+    scheduler.shutdown()
+
+
+async def test_should_run_hash_exceeding_memory_budget_alone():
+    scheduler = security.HashingScheduler(
+        max_concurrency=2,
+        max_queue_size=2,
+        memory_budget=100,
+    )
+
+    await asyncio.wait_for(
+        scheduler.run(time.sleep, 0, memory_cost=200),
+        timeout=1,
+    )
+    scheduler.shutdown()
+
+
+def test_should_take_memory_cost_from_hash():
+    other_ph = argon2.PasswordHasher(memory_cost=security.ph.memory_cost * 2)
+    hashed_password = other_ph.hash("password")
+
+    assert security.hash_memory_cost(hashed_password) == other_ph.memory_cost
+    assert security.hash_memory_cost(hashed_password.encode()) == (other_ph.memory_cost)
+    assert security.hash_memory_cost("not a hash") == security.ph.memory_cost
+
+
+async def test_should_not_wait_for_hashes_on_shutdown():
+    scheduler = security.HashingScheduler(max_concurrency=1, max_queue_size=1)
+    running = asyncio.create_task(scheduler.run(time.sleep, 0.2))
+    await asyncio.sleep(0.01)
+
+    start_time = time.perf_counter()
+    scheduler.shutdown()
+    assert time.perf_counter() - start_time < 0.1
+
+    await running
+
+
+def test_should_bound_hashing_concurrency_by_memory():
+    memory_cost = security.ph.memory_cost // 1024  # MiB
+    assert security.hashing_concurrency(8, memory_cost * 3) == 3
+    assert security.hashing_concurrency(2, memory_cost * 3) == 2
+    assert security.hashing_concurrency(8, 0) == 1
+
+
+async def test_should_need_rehash_for_other_parameters():
+    assert not security.password_needs_rehash(
+        await security.hash_password("password"),
+    )
+
+    other_ph = argon2.PasswordHasher(time_cost=security.ph.time_cost + 1)
+    assert security.password_needs_rehash(other_ph.hash("password"))
@@ -3,6 +3,7 @@ from collections.abc import AsyncIterator
 import pytest
 from app.adapters.database import dsn
 from app.adapters.database import ServiceDatabase
+from app.adapters.redis import ServiceRedis
 from app.common import settings
 from app.common.context import Context
 from redis.asyncio import Redis
@@ -12,7 +13,7 @@ class TestContext(Context):
     def __init__(
         self,
         db: ServiceDatabase,
-        redis: Redis,
+        redis: ServiceRedis,
     ) -> None:
         self._db = db
         self._redis = redis
@@ -22,7 +23,7 @@ class TestContext(Context):
         return self._db
 
     @property
-    def redis(self) -> Redis:
+    def redis(self) -> ServiceRedis:
         return self._redis
 
 
@@ -37,14 +38,16 @@ async def db() -> AsyncIterator[ServiceDatabase]:
             port=settings.WRITE_DB_PORT,
             database=settings.WRITE_DB_NAME,
         ),
-        read_dsn=dsn(
-            scheme=settings.WRITE_DB_SCHEME,
-            user=settings.READ_DB_USER,
-            password=settings.READ_DB_PASS,
-            host=settings.READ_DB_HOST,
-            port=settings.READ_DB_PORT,
-            database=settings.READ_DB_NAME,
-        ),
+        read_dsns=[
+            dsn(
+                scheme=settings.WRITE_DB_SCHEME,
+                user=settings.READ_DB_USER,
+                password=settings.READ_DB_PASS,
+                host=settings.READ_DB_HOST,
+                port=settings.READ_DB_PORT,
+                database=settings.READ_DB_NAME,
+            ),
+        ],
         min_pool_size=settings.MIN_DB_POOL_SIZE,
         max_pool_size=settings.MAX_DB_POOL_SIZE,
         ssl=settings.DB_USE_SSL,
@@ -58,11 +61,13 @@ async def db() -> AsyncIterator[ServiceDatabase]:
 
 
 @pytest.fixture(scope="function")
-async def redis() -> AsyncIterator[Redis]:
-    async with Redis(
-        host=settings.REDIS_HOST,
-        port=settings.REDIS_PORT,
-        db=settings.REDIS_DB,
+async def redis() -> AsyncIterator[ServiceRedis]:
+    async with ServiceRedis(
+        primary=Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+        ),
     ) as redis:
         yield redis
 
@@ -70,5 +75,5 @@ async def redis() -> AsyncIterator[Redis]:
 
 
 @pytest.fixture
-async def ctx(db: ServiceDatabase, redis: Redis) -> TestContext:
+async def ctx(db: ServiceDatabase, redis: ServiceRedis) -> TestContext:
     return TestContext(db=db, redis=redis)
@@ -0,0 +1,99 @@
+import asyncio
+
+from app.common import settings
+from app.common.context import Context
+from app.repositories import login_throttles as login_throttles_repo
+from testing import sample_data
+
+
+async def test_should_bound_parallel_attempts(ctx: Context):
+    phone_number = sample_data.fake_phone_number()
+    ip_address = sample_data.fake_ipv4_address()
+    max_failures = settings.LOGIN_THROTTLE_MAX_PHONE_NUMBER_FAILURES
+
+    attempt_ids = await asyncio.gather(
+        *(
+            login_throttles_repo.record_attempt(ctx, phone_number, ip_address)
+            for _ in range(max_failures * 2)
+        ),
+    )
+
+    assert len([attempt_id for attempt_id in attempt_ids if attempt_id]) == (
+        max_failures
+    )
+
+
+async def test_should_allow_attempt_after_forgetting_one(ctx: Context):
+    phone_number = sample_data.fake_phone_number()
+    ip_address = sample_data.fake_ipv4_address()
+
+    for _ in range(settings.LOGIN_THROTTLE_MAX_PHONE_NUMBER_FAILURES):
+        attempt_id = await login_throttles_repo.record_attempt(
+            ctx,
+            phone_number,
+            ip_address,
+        )
+    assert attempt_id is not None
+    assert (
+        await login_throttles_repo.record_attempt(ctx, phone_number, ip_address) is None
+    )
+
+    await login_throttles_repo.forget_attempt(
+        ctx,
+        phone_number,
+        ip_address,
+        attempt_id,
+    )
+    assert (
+        await login_throttles_repo.record_attempt(ctx, phone_number, ip_address)
+        is not None
+    )
+
+
+async def test_should_not_count_throttled_attempt_against_ip_address(ctx: Context):
+    phone_number = sample_data.fake_phone_number()
+
+    for _ in range(settings.LOGIN_THROTTLE_MAX_PHONE_NUMBER_FAILURES):
+        await login_throttles_repo.record_attempt(
+            ctx,
+            phone_number,
+            sample_data.fake_ipv4_address(),
+        )
+
+    ip_address = sample_data.fake_ipv4_address()
+    assert (
+        await login_throttles_repo.record_attempt(ctx, phone_number, ip_address) is None
+    )
+    assert (
+        await ctx.redis.zcard(
+            login_throttles_repo.create_ip_address_failures_key(ip_address),
+        )
+        == 0
+    )
+
+
+async def test_should_throttle_attempts_without_ip_address_by_phone_number(
+    ctx: Context,
+):
+    phone_number = sample_data.fake_phone_number()
+
+    for _ in range(settings.LOGIN_THROTTLE_MAX_PHONE_NUMBER_FAILURES):
+        attempt_id = await login_throttles_repo.record_attempt(
+            ctx,
+            phone_number,
+            None,
+        )
+        assert attempt_id is not None
+
+    assert await login_throttles_repo.record_attempt(ctx, phone_number, None) is None
+
+    # attempts without an ip address don't share one bucket
+    for _ in range(settings.LOGIN_THROTTLE_MAX_IP_ADDRESS_FAILURES):
+        assert (
+            await login_throttles_repo.record_attempt(
+                ctx,
+                sample_data.fake_phone_number(),
+                None,
+            )
+            is not None
+        )
@@ -0,0 +1,290 @@
+import asyncio
+import uuid
+from datetime import datetime
+from datetime import timedelta
+
+import pytest
+from app.adapters.database import ServiceDatabase
+from app.adapters.redis import ServiceRedis
+from app.common import settings
+from app.common.context import Context
+from app.repositories import sessions as sessions_repo
+from testing.stub_redis import StubRedisCluster
+
+
+class ClusterContext(Context):
+    def __init__(self, redis: ServiceRedis) -> None:
+        self._redis = redis
+
+    @property
+    def db(self) -> ServiceDatabase:
+        raise NotImplementedError
+
+    @property
+    def redis(self) -> ServiceRedis:
+        return self._redis
+
+
+async def _wait_for(condition, timeout: float = 5.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+async def test_should_serve_session_from_cache(ctx: Context):
+    sessions_repo.session_cache.clear()
+    session = await sessions_repo.create(ctx, uuid.uuid4(), uuid.uuid4())
+
+    hits = sessions_repo.SESSION_CACHE_HITS._value.get()
+    assert await sessions_repo.fetch_one(ctx, session["session_id"]) == session
+    assert sessions_repo.SESSION_CACHE_HITS._value.get() == hits
+
+    # served from the cache, without redis
+    await ctx.redis.delete(sessions_repo.create_session_key(session["session_id"]))
+    assert await sessions_repo.fetch_one(ctx, session["session_id"]) == session
+    assert sessions_repo.SESSION_CACHE_HITS._value.get() == hits + 1
+
+
+async def test_should_not_publish_invalidation_for_new_session(ctx: Context):
+    async with ctx.redis.pubsub() as pubsub:
+        await pubsub.subscribe(sessions_repo.SESSION_INVALIDATIONS_CHANNEL)
+        await pubsub.get_message(timeout=1)  # the subscription confirmation
+
+        session = await sessions_repo.create(ctx, uuid.uuid4(), uuid.uuid4())
+        assert await pubsub.get_message(timeout=0.1) is None
+
+        await sessions_repo.delete(ctx, session["session_id"])
+        message = await pubsub.get_message(timeout=1)
+        assert message is not None
+        assert message["data"].decode() == session["session_id"]
+
+
+async def test_should_evict_sessions_invalidated_by_other_processes(ctx: Context):
+    sessions_repo.session_cache.clear()
+    session = await sessions_repo.create(ctx, uuid.uuid4(), uuid.uuid4())
+    await sessions_repo.fetch_one(ctx, session["session_id"])
+    assert sessions_repo.session_cache.get(session["session_id"]) is not None
+
+    listener = asyncio.create_task(sessions_repo.listen_for_invalidations(ctx.redis))
+    try:
+        await _wait_for(lambda: len(sessions_repo.session_cache) == 0)
+
+        # cached again, and then updated by another process
+        await sessions_repo.fetch_one(ctx, session["session_id"])
+        await _wait_for(
+            lambda: sessions_repo.session_cache.get(session["session_id"]),
+        )
+        await ctx.redis.publish(
+            sessions_repo.SESSION_INVALIDATIONS_CHANNEL,
+            session["session_id"],
+        )
+        await _wait_for(
+            lambda: sessions_repo.session_cache.get(session["session_id"]) is None,
+        )
+    finally:
+        listener.cancel()
+
+
+async def test_should_not_extend_session_before_threshold(
+    ctx: Context,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "SESSION_SLIDING_EXPIRY", True)
+    monkeypatch.setattr(settings, "SESSION_SLIDING_EXPIRY_THRESHOLD", 0.5)
+
+    session = await sessions_repo.create(ctx, uuid.uuid4(), uuid.uuid4())
+
+    fetched_session = await sessions_repo.fetch_one(ctx, session["session_id"])
+    assert fetched_session is not None
+    assert fetched_session["expires_at"] == session["expires_at"]
+
+
+async def test_should_extend_session_past_threshold(
+    ctx: Context,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "SESSION_SLIDING_EXPIRY", True)
+    monkeypatch.setattr(settings, "SESSION_SLIDING_EXPIRY_THRESHOLD", 0.5)
+
+    session = await sessions_repo.create(ctx, uuid.uuid4(), uuid.uuid4())
+    # less than half of the session's lifetime remains
+    expires_at = datetime.now() + timedelta(seconds=sessions_repo.SESSION_EXPIRY / 4)
+    await ctx.redis.hset(
+        sessions_repo.create_session_key(session["session_id"]),
+        "e",
+        sessions_repo._encode_datetime(expires_at.isoformat()),
+    )
+
+    async with ctx.redis.pubsub() as pubsub:
+        await pubsub.subscribe(sessions_repo.SESSION_INVALIDATIONS_CHANNEL)
+        await pubsub.get_message(timeout=1)  # the subscription confirmation
+
+        fetched_session = await sessions_repo.fetch_one(ctx, session["session_id"])
+        assert fetched_session is not None
+        assert datetime.fromisoformat(fetched_session["expires_at"]) > expires_at
+
+        # other processes are told to drop the old expiry from their caches
+        message = await pubsub.get_message(timeout=1)
+        assert message is not None
+        assert message["data"].decode() == session["session_id"]
+
+    session_key = sessions_repo.create_session_key(session["session_id"])
+    assert await ctx.redis.ttl(session_key) > sessions_repo.SESSION_EXPIRY / 2
+
+    stored_session = await sessions_repo._fetch_one_uncached(ctx, session["session_id"])
+    assert stored_session is not None
+    assert stored_session["expires_at"] == fetched_session["expires_at"]
+
+
+async def test_should_delete_session_updated_to_expire_in_past(ctx: Context):
+    account_id = uuid.uuid4()
+    session = await sessions_repo.create(ctx, uuid.uuid4(), account_id)
+    await sessions_repo.fetch_one(ctx, session["session_id"])  # now cached
+
+    async with ctx.redis.pubsub() as pubsub:
+        await pubsub.subscribe(sessions_repo.SESSION_INVALIDATIONS_CHANNEL)
+        await pubsub.get_message(timeout=1)  # the subscription confirmation
+
+        expires_at = datetime.now() - timedelta(minutes=1)
+        updated_session = await sessions_repo.partial_update(
+            ctx,
+            session["session_id"],
+            expires_at=expires_at,
+        )
+        assert updated_session is not None
+        assert updated_session["expires_at"] == expires_at.isoformat()
+
+        message = await pubsub.get_message(timeout=1)
+        assert message is not None
+        assert message["data"].decode() == session["session_id"]
+
+    assert await sessions_repo.fetch_one(ctx, session["session_id"]) is None
+    assert not await ctx.redis.exists(
+        sessions_repo.create_session_key(session["session_id"]),
+    )
+    assert not await ctx.redis.zcard(
+        sessions_repo.create_account_sessions_key(account_id),
+    )
+
+
+async def test_should_not_extend_session_with_explicit_expiry(
+    ctx: Context,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "SESSION_SLIDING_EXPIRY", True)
+    monkeypatch.setattr(settings, "SESSION_SLIDING_EXPIRY_THRESHOLD", 0.5)
+
+    session = await sessions_repo.create(ctx, uuid.uuid4(), uuid.uuid4())
+    expires_at = datetime.now() + timedelta(minutes=10)
+    await sessions_repo.partial_update(
+        ctx,
+        session["session_id"],
+        expires_at=expires_at,
+    )
+
+    fetched_session = await sessions_repo.fetch_one(ctx, session["session_id"])
+    assert fetched_session is not None
+    assert fetched_session["expires_at"] == expires_at.isoformat()
+
+    session_key = sessions_repo.create_session_key(session["session_id"])
+    assert await ctx.redis.ttl(session_key) <= 601  # rounded up to the second
+
+
+async def test_should_list_sessions_alongside_revocations(
+    ctx: Context,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "SESSION_TOKEN_SECRET", b"secret")
+
+    session = await sessions_repo.create(ctx, uuid.uuid4(), uuid.uuid4())
+    revoked_session = await sessions_repo.create(ctx, uuid.uuid4(), uuid.uuid4())
+    await sessions_repo.delete(ctx, revoked_session["session_id"])
+    assert sessions_repo.is_revoked(revoked_session["session_id"])
+
+    warnings = []
+    monkeypatch.setattr(
+        sessions_repo.logger,
+        "warning",
+        lambda *args, **kwargs: warnings.append(args),
+    )
+
+    sessions, cursor = await sessions_repo.fetch_many(ctx)
+    assert sessions == [session]
+    assert cursor is None
+    assert warnings == []
+
+
+async def test_should_fetch_all_pages_of_sessions_with_equal_expiries(ctx: Context):
+    account_id = uuid.uuid4()
+    expires_at = datetime.now() + timedelta(minutes=30)
+
+    session_ids = []
+    for _ in range(5):
+        session = await sessions_repo.create(ctx, uuid.uuid4(), account_id)
+        await sessions_repo.partial_update(
+            ctx,
+            session["session_id"],
+            expires_at=expires_at,
+        )
+        session_ids.append(session["session_id"])
+
+    fetched_session_ids = []
+    cursor = None
+    while True:
+        sessions, cursor = await sessions_repo.fetch_many(
+            ctx,
+            account_id=account_id,
+            cursor=cursor,
+            page_size=2,
+        )
+        fetched_session_ids.extend(session["session_id"] for session in sessions)
+        if cursor is None:
+            break
+
+        assert sessions_repo.is_valid_cursor(cursor, account_id)
+
+    assert sorted(fetched_session_ids) == sorted(session_ids)
+
+
+async def test_should_fetch_all_pages_of_sessions_across_cluster_nodes():
+    cluster = StubRedisCluster(node_count=3)
+
+    now = datetime.now()
+    session_ids: set[str] = set()
+    sessions_per_node = dict.fromkeys(cluster.nodes, 0)
+    while min(sessions_per_node.values()) < 4:
+        session = {
+            "session_id": str(uuid.uuid4()),
+            "account_id": str(uuid.uuid4()),
+            "expires_at": (now + timedelta(hours=1)).isoformat(),
+            "created_at": now.isoformat(),
+            "updated_at": now.isoformat(),
+        }
+        session_key = sessions_repo.create_session_key(session["session_id"])
+        await cluster.hset(
+            session_key,
+            mapping=sessions_repo.encode_session(session),
+        )
+        session_ids.add(session["session_id"])
+        sessions_per_node[cluster.node_for(session_key)] += 1
+
+    ctx = ClusterContext(ServiceRedis(primary=cluster))
+
+    fetched_session_ids = []
+    nodes = []
+    cursor = None
+    while True:
+        sessions, cursor = await sessions_repo.fetch_many(
+            ctx, cursor=cursor, page_size=2
+        )
+        fetched_session_ids.extend(session["session_id"] for session in sessions)
+        if cursor is None:
+            break
+
+        assert sessions_repo.is_valid_cursor(cursor)
+        nodes.append(sessions_repo._decode_cursor(cursor)[0])
+
+    assert sorted(fetched_session_ids) == sorted(session_ids)
+    # the cursor moves on through every node in turn
+    assert nodes == sorted(nodes)
+    assert set(nodes) == {0, 1, 2}
@@ -4,6 +4,7 @@ from app.common import formatters
 from app.common.context import Context
 from app.common.errors import ServiceError
 from app.services import accounts
+from app.services import sessions
 from testing import sample_data
 
 
@@ -368,6 +369,37 @@ async def test_should_delete_account(ctx: Context):
     assert data2["last_name"] == last_name
 
 
+async def test_should_delete_account_sessions(ctx: Context):
+    phone_number = sample_data.fake_phone_number()
+    password = sample_data.fake_password()
+    first_name = sample_data.fake_first_name()
+    last_name = sample_data.fake_last_name()
+
+    data = await accounts.create(
+        ctx,
+        phone_number=phone_number,
+        password=password,
+        first_name=first_name,
+        last_name=last_name,
+    )
+    assert not isinstance(data, ServiceError)
+
+    data2 = await sessions.create(
+        ctx,
+        phone_number=phone_number,
+        password=password,
+        ip_address=sample_data.fake_ipv4_address(),
+        user_agent=sample_data.fake_user_agent(),
+    )
+    assert not isinstance(data2, ServiceError)
+
+    data3 = await accounts.delete(ctx, account_id=data["account_id"])
+    assert not isinstance(data3, ServiceError)
+
+    data4 = await sessions.fetch_one(ctx, session_id=data2["session_id"])
+    assert data4 is ServiceError.SESSIONS_NOT_FOUND
+
+
 async def test_should_not_delete_nonexistent_account(ctx: Context):
     data = await accounts.delete(ctx, account_id=uuid.uuid4())
     assert data is ServiceError.ACCOUNTS_NOT_FOUND
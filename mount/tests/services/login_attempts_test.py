@@ -3,6 +3,7 @@ import uuid
 from app.common import formatters
 from app.common.context import Context
 from app.common.errors import ServiceError
+from app.repositories import login_attempts as login_attempts_repo
 from app.services import login_attempts
 from testing import sample_data
 
@@ -64,6 +65,51 @@ async def test_should_not_fetch_one_nonexistent_login_attempt(ctx: Context):
     assert data is ServiceError.LOGIN_ATTEMPTS_NOT_FOUND
 
 
+async def test_should_flush_buffered_login_attempts(ctx: Context):
+    buffer = login_attempts_repo.LoginAttemptBuffer(
+        ctx.db,
+        max_size=10,
+        batch_size=2,
+        flush_interval=60,
+    )
+
+    login_attempt_ids = [uuid.uuid4() for _ in range(3)]
+    for login_attempt_id in login_attempt_ids:
+        assert buffer.add(
+            login_attempt_id,
+            phone_number=sample_data.fake_phone_number(),
+            ip_address=sample_data.fake_ipv4_address(),
+            user_agent=sample_data.fake_user_agent(),
+        )
+
+    await buffer.flush()
+    assert len(buffer) == 0
+
+    for login_attempt_id in login_attempt_ids:
+        data = await login_attempts.fetch_one(ctx, login_attempt_id=login_attempt_id)
+        assert not isinstance(data, ServiceError)
+
+
+async def test_should_drop_login_attempts_when_buffer_full(ctx: Context):
+    buffer = login_attempts_repo.LoginAttemptBuffer(
+        ctx.db,
+        max_size=1,
+        batch_size=1,
+        flush_interval=60,
+    )
+
+    for expected in (True, False):
+        added = buffer.add(
+            uuid.uuid4(),
+            phone_number=sample_data.fake_phone_number(),
+            ip_address=sample_data.fake_ipv4_address(),
+            user_agent=sample_data.fake_user_agent(),
+        )
+        assert added is expected
+
+    assert len(buffer) == 1
+
+
 async def test_should_fetch_all_login_attempts(ctx: Context):
     expected = []
     for _ in range(3):
@@ -1,10 +1,16 @@
+import asyncio
 import uuid
 from datetime import datetime
 from datetime import timedelta
 
+import argon2
 from app.common import formatters
+from app.common import security
+from app.common import settings
 from app.common.context import Context
 from app.common.errors import ServiceError
+from app.repositories import credentials as credentials_repo
+from app.repositories import login_attempts as login_attempts_repo
 from app.services import accounts
 from app.services import sessions
 from testing import sample_data
@@ -49,6 +55,50 @@ async def test_should_create_session(ctx: Context):
     }
 
 
+async def test_should_rehash_outdated_password_on_login(ctx: Context):
+    phone_number = sample_data.fake_phone_number()
+    password = sample_data.fake_password()
+
+    data = await accounts.create(
+        ctx,
+        phone_number=phone_number,
+        password=password,
+        first_name=sample_data.fake_first_name(),
+        last_name=sample_data.fake_last_name(),
+    )
+    assert not isinstance(data, ServiceError)
+
+    credentials = await credentials_repo.fetch_one(
+        ctx,
+        identifier=formatters.phone_number(phone_number),
+    )
+    assert credentials is not None
+    outdated_ph = argon2.PasswordHasher(time_cost=security.ph.time_cost + 1)
+    await credentials_repo.partial_update(
+        ctx,
+        credentials["credentials_id"],
+        secret=outdated_ph.hash(password),
+    )
+
+    data2 = await sessions.create(
+        ctx,
+        phone_number=phone_number,
+        password=password,
+        ip_address=sample_data.fake_ipv4_address(),
+        user_agent=sample_data.fake_user_agent(),
+    )
+    assert not isinstance(data2, ServiceError)
+
+    await asyncio.gather(*sessions._rehash_tasks)
+    credentials = await credentials_repo.fetch_one(
+        ctx,
+        credentials_id=credentials["credentials_id"],
+    )
+    assert credentials is not None
+    assert not security.password_needs_rehash(credentials["secret"])
+    assert await security.verify_password(credentials["secret"], password)
+
+
 async def test_should_not_create_session_with_invalid_phone_number(ctx: Context):
     data = await sessions.create(
         ctx,
@@ -111,6 +161,79 @@ async def test_should_not_create_session_with_incorrect_password(ctx: Context):
     assert data2 is ServiceError.CREDENTIALS_INCORRECT
 
 
+async def test_should_throttle_login_after_repeated_failures(ctx: Context):
+    phone_number = sample_data.fake_phone_number()
+    password = sample_data.fake_password()
+    ip_address = sample_data.fake_ipv4_address()
+
+    data = await accounts.create(
+        ctx,
+        phone_number=phone_number,
+        password=password,
+        first_name=sample_data.fake_first_name(),
+        last_name=sample_data.fake_last_name(),
+    )
+    assert not isinstance(data, ServiceError)
+
+    for _ in range(settings.LOGIN_THROTTLE_MAX_PHONE_NUMBER_FAILURES):
+        data2 = await sessions.create(
+            ctx,
+            phone_number=phone_number,
+            password=sample_data.fake_password(),
+            ip_address=ip_address,
+            user_agent=sample_data.fake_user_agent(),
+        )
+        assert data2 is ServiceError.CREDENTIALS_INCORRECT
+
+    # even the correct password is refused until the window passes
+    data3 = await sessions.create(
+        ctx,
+        phone_number=phone_number,
+        password=password,
+        ip_address=ip_address,
+        user_agent=sample_data.fake_user_agent(),
+    )
+    assert data3 is ServiceError.SESSIONS_LOGIN_THROTTLED
+
+    # throttled attempts are still recorded
+    login_attempts = await login_attempts_repo.fetch_many(ctx, ip_address=ip_address)
+    assert len(login_attempts) == settings.LOGIN_THROTTLE_MAX_PHONE_NUMBER_FAILURES + 1
+
+
+async def test_should_throttle_parallel_login_failures(ctx: Context):
+    phone_number = sample_data.fake_phone_number()
+    ip_address = sample_data.fake_ipv4_address()
+
+    data = await accounts.create(
+        ctx,
+        phone_number=phone_number,
+        password=sample_data.fake_password(),
+        first_name=sample_data.fake_first_name(),
+        last_name=sample_data.fake_last_name(),
+    )
+    assert not isinstance(data, ServiceError)
+
+    # every attempt is counted before any password is verified
+    results = await asyncio.gather(
+        *(
+            sessions.create(
+                ctx,
+                phone_number=phone_number,
+                password=sample_data.fake_password(),
+                ip_address=ip_address,
+                user_agent=sample_data.fake_user_agent(),
+            )
+            for _ in range(settings.LOGIN_THROTTLE_MAX_PHONE_NUMBER_FAILURES * 2)
+        ),
+    )
+    assert results.count(ServiceError.CREDENTIALS_INCORRECT) == (
+        settings.LOGIN_THROTTLE_MAX_PHONE_NUMBER_FAILURES
+    )
+    assert results.count(ServiceError.SESSIONS_LOGIN_THROTTLED) == (
+        settings.LOGIN_THROTTLE_MAX_PHONE_NUMBER_FAILURES
+    )
+
+
 async def test_should_fetch_one_session(ctx: Context):
     phone_number = sample_data.fake_phone_number()
     password = sample_data.fake_password()
@@ -257,9 +380,11 @@ async def test_should_fetch_all_sessions(ctx: Context):
 
     data3 = await sessions.fetch_many(ctx)
     assert not isinstance(data3, ServiceError)
-    assert len(data3) == 3
+    page, next_cursor = data3
+    assert len(page) == 3
+    assert next_cursor is None
 
-    for account_data in data3:
+    for account_data in page:
         expected_data = expected[account_data["session_id"]]
 
         assert account_data["session_id"] == expected_data["session_id"]
@@ -269,6 +394,59 @@ async def test_should_fetch_all_sessions(ctx: Context):
         assert account_data["updated_at"] == expected_data["updated_at"]
 
 
+async def test_should_fetch_all_sessions_for_account(ctx: Context):
+    accounts_data = []
+    for _ in range(2):
+        phone_number = sample_data.fake_phone_number()
+        password = sample_data.fake_password()
+        first_name = sample_data.fake_first_name()
+        last_name = sample_data.fake_last_name()
+
+        data = await accounts.create(
+            ctx,
+            phone_number=phone_number,
+            password=password,
+            first_name=first_name,
+            last_name=last_name,
+        )
+        assert not isinstance(data, ServiceError)
+
+        accounts_data.append((data, phone_number, password))
+
+    expected = {}
+    for account_data, phone_number, password in accounts_data:
+        for _ in range(2):
+            data2 = await sessions.create(
+                ctx,
+                phone_number=phone_number,
+                password=password,
+                ip_address=sample_data.fake_ipv4_address(),
+                user_agent=sample_data.fake_user_agent(),
+            )
+            assert not isinstance(data2, ServiceError)
+
+            if account_data is accounts_data[0][0]:
+                expected[data2["session_id"]] = data2
+
+    data3 = await sessions.fetch_many(
+        ctx,
+        account_id=accounts_data[0][0]["account_id"],
+    )
+    assert not isinstance(data3, ServiceError)
+    page, next_cursor = data3
+    assert len(page) == 2
+    assert next_cursor is None
+
+    for session_data in page:
+        expected_data = expected[session_data["session_id"]]
+
+        assert session_data["session_id"] == expected_data["session_id"]
+        assert session_data["account_id"] == expected_data["account_id"]
+        assert session_data["expires_at"] == expected_data["expires_at"]
+        assert session_data["created_at"] == expected_data["created_at"]
+        assert session_data["updated_at"] == expected_data["updated_at"]
+
+
 async def test_should_fetch_one_page_of_sessions(ctx: Context):
     expected = []
     for _ in range(3):
@@ -309,11 +487,13 @@ async def test_should_fetch_one_page_of_sessions(ctx: Context):
             "updated_at",
         }
 
-    data3 = await sessions.fetch_many(ctx, page=1, page_size=2)
+    data3 = await sessions.fetch_many(ctx, page_size=2)
     assert not isinstance(data3, ServiceError)
-    assert len(data3) == 2
+    page, next_cursor = data3
+    assert len(page) == 2
+    assert next_cursor is not None
 
-    for account_data, expected_data in zip(data3, expected):
+    for account_data, expected_data in zip(page, expected):
         assert account_data["session_id"] == expected_data["session_id"]
         assert account_data["account_id"] == expected_data["account_id"]
         assert account_data["expires_at"] == expected_data["expires_at"]
@@ -321,6 +501,52 @@ async def test_should_fetch_one_page_of_sessions(ctx: Context):
         assert account_data["updated_at"] == expected_data["updated_at"]
 
 
+async def test_should_fetch_all_pages_of_sessions(ctx: Context):
+    expected = {}
+    for _ in range(5):
+        phone_number = sample_data.fake_phone_number()
+        password = sample_data.fake_password()
+
+        data = await accounts.create(
+            ctx,
+            phone_number=phone_number,
+            password=password,
+            first_name=sample_data.fake_first_name(),
+            last_name=sample_data.fake_last_name(),
+        )
+        assert not isinstance(data, ServiceError)
+
+        data2 = await sessions.create(
+            ctx,
+            phone_number=phone_number,
+            password=password,
+            ip_address=sample_data.fake_ipv4_address(),
+            user_agent=sample_data.fake_user_agent(),
+        )
+        assert not isinstance(data2, ServiceError)
+
+        expected[data2["session_id"]] = data2
+
+    seen = []
+    cursor = None
+    while True:
+        data3 = await sessions.fetch_many(ctx, cursor=cursor, page_size=2)
+        assert not isinstance(data3, ServiceError)
+        page, cursor = data3
+        assert len(page) <= 2
+
+        seen.extend(session["session_id"] for session in page)
+        if cursor is None:
+            break
+
+    assert sorted(seen) == sorted(expected)
+
+
+async def test_should_not_fetch_sessions_with_invalid_cursor(ctx: Context):
+    data = await sessions.fetch_many(ctx, cursor="not-a-cursor")
+    assert data is ServiceError.SESSIONS_CURSOR_INVALID
+
+
 async def test_should_partial_update_session(ctx: Context):
     phone_number = sample_data.fake_phone_number()
     password = sample_data.fake_password()
@@ -541,3 +767,56 @@ async def test_should_not_delete_deleted_session(ctx: Context):
 
     data4 = await sessions.delete(ctx, session_id=data2["session_id"])
     assert data4 is ServiceError.SESSIONS_NOT_FOUND
+
+
+async def test_should_delete_all_sessions_for_account(ctx: Context):
+    accounts_data = []
+    for _ in range(2):
+        phone_number = sample_data.fake_phone_number()
+        password = sample_data.fake_password()
+        first_name = sample_data.fake_first_name()
+        last_name = sample_data.fake_last_name()
+
+        data = await accounts.create(
+            ctx,
+            phone_number=phone_number,
+            password=password,
+            first_name=first_name,
+            last_name=last_name,
+        )
+        assert not isinstance(data, ServiceError)
+
+        accounts_data.append((data, phone_number, password))
+
+    sessions_data = []
+    for account_data, phone_number, password in accounts_data:
+        for _ in range(3):
+            data2 = await sessions.create(
+                ctx,
+                phone_number=phone_number,
+                password=password,
+                ip_address=sample_data.fake_ipv4_address(),
+                user_agent=sample_data.fake_user_agent(),
+            )
+            assert not isinstance(data2, ServiceError)
+
+            sessions_data.append(data2)
+
+    data3 = await sessions.delete_many(
+        ctx,
+        account_id=accounts_data[0][0]["account_id"],
+    )
+    assert data3 == 3
+
+    for session_data in sessions_data:
+        data4 = await sessions.fetch_one(ctx, session_id=session_data["session_id"])
+        if session_data["account_id"] == accounts_data[0][0]["account_id"]:
+            assert data4 is ServiceError.SESSIONS_NOT_FOUND
+        else:
+            assert not isinstance(data4, ServiceError)
+
+    data5 = await sessions.delete_many(
+        ctx,
+        account_id=accounts_data[0][0]["account_id"],
+    )
+    assert data5 == 0